@@ -3,8 +3,9 @@ from tkinter import ttk, messagebox, filedialog
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
-import re
 import subprocess
+from gcode_parser import load_program, parse_gcode, validate_program
+from arduino_operations import convert_gcode_to_arduino, write_arduino_sketch
 
 class CNCApp:
     def __init__(self, root):
@@ -174,16 +175,7 @@ class CNCApp:
 
     def validate_gcode(self, gcode):
         """Valida le istruzioni G-code."""
-        valid_commands = {"G0", "G1", "G2", "G3", "G4", "G17", "G18", "G19", "G20", "G21", "G28", "G30", "G90", "G91", "G92"}
-        for line_num, line in enumerate(gcode.splitlines(), start=1):
-            line = line.strip()
-            if not line:
-                continue
-            match = re.match(r'^(G\d+)', line)
-            if match and match.group(1) in valid_commands:
-                continue
-            return False, f"L'istruzione '{line}' alla linea {line_num} non è valida."
-        return True, ""
+        return validate_program(parse_gcode(gcode))
 
     def cancel_new_program(self):
         """Annulla la creazione o modifica di un programma."""
@@ -207,18 +199,11 @@ class CNCApp:
     def translate_gcode_to_arduino(self, program_path):
         """Traduci un programma G-code in comandi Arduino e scrivilo in un file .ino."""
         try:
-            with open(program_path, 'r') as file:
-                gcode_data = file.readlines()
-
-            arduino_commands = self.convert_gcode_to_arduino(gcode_data)
-
-            arduino_file_base = os.path.splitext(os.path.basename(program_path))[0]
-            arduino_dir = os.path.join(os.path.dirname(program_path), arduino_file_base)
-            os.makedirs(arduino_dir, exist_ok=True)
-
-            arduino_file_path = os.path.join(arduino_dir, f"{arduino_file_base}.ino")
-            with open(arduino_file_path, 'w') as arduino_file:
-                arduino_file.write(arduino_commands)
+            program = load_program(program_path)
+            try:
+                arduino_file_path = write_arduino_sketch(program_path, self.convert_gcode_to_arduino(program))
+            finally:
+                program.close()
 
             self.show_message(f"Programma tradotto e salvato in {arduino_file_path}", "info")
             return arduino_file_path
@@ -226,87 +211,9 @@ class CNCApp:
             self.show_message(f"Errore: Impossibile tradurre il programma G-code: {e}", "error")
             return None
 
-    def convert_gcode_to_arduino(self, gcode_data):
-        """Converti le istruzioni G-code in comandi Arduino."""
-        arduino_code = """
-// Dichiarazione delle funzioni
-void blink(int x, int y, int z);
-void turnOnPin(int pin, int duration);
-void turnOnAnalogPin(int pin, int duration);
-
-// Configurazione iniziale
-void setup() {
-  pinMode(13, OUTPUT);  // Pin per il controllo
-  Serial.begin(115200);  // Inizializza la comunicazione seriale
-}
-
-// Funzioni di utilità
-void blink(int x, int y, int z) {
-  int onTime = y * 1000;  // Converti in millisecondi
-  int offTime = z * 1000; // Converti in millisecondi
-
-  for (int i = 0; i < x; i++) {
-    digitalWrite(13, HIGH); // Accendi il pin
-    delay(onTime);          // Aspetta il tempo di accensione
-    digitalWrite(13, LOW);  // Spegni il pin
-    delay(offTime);         // Aspetta il tempo di spegnimento
-  }
-}
-
-void turnOnPin(int pin, int duration) {
-  pinMode(pin, OUTPUT);
-  digitalWrite(pin, HIGH);
-  delay(duration * 1000); // Converti in millisecondi
-  digitalWrite(pin, LOW);
-}
-
-void turnOnAnalogPin(int pin, int duration) {
-  pinMode(pin, OUTPUT);
-  analogWrite(pin, 255); // Imposta il valore analogico massimo
-  delay(duration * 1000); // Converti in millisecondi
-  analogWrite(pin, 0); // Spegni il pin analogico
-}
-
-void loop() {
-"""
-        for line in gcode_data:
-            line = line.strip()
-            if line.startswith('G1'):
-                parts = line.split()
-                x = y = z = None
-                for part in parts:
-                    if part.startswith('X'):
-                        x = part[1:]
-                    elif part.startswith('Y'):
-                        y = part[1:]
-                    elif part.startswith('Z'):
-                        z = part[1:]
-                if x and y and z:
-                    arduino_code += f'  blink({x}, {y}, {z});\n'
-            elif line.startswith('G2'):
-                parts = line.split()
-                pin = duration = None
-                for part in parts:
-                    if part.startswith('X'):
-                        pin = part[1:]
-                    elif part.startswith('Y'):
-                        duration = part[1:]
-                if pin and duration:
-                    arduino_code += f'  turnOnPin({pin}, {duration});\n'
-            elif line.startswith('G3'):
-                parts = line.split()
-                pin = duration = None
-                for part in parts:
-                    if part.startswith('X'):
-                        pin = part[1:]
-                    elif part.startswith('Y'):
-                        duration = part[1:]
-                if pin and duration:
-                    arduino_code += f'  turnOnAnalogPin({pin}, {duration});\n'
-        arduino_code += """
-}
-"""
-        return arduino_code
+    def convert_gcode_to_arduino(self, program):
+        """Converti un programma G-code compilato in comandi Arduino."""
+        return convert_gcode_to_arduino(program)
 
     def upload_to_arduino(self):
         """Carica il programma selezionato su Arduino."""
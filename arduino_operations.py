@@ -0,0 +1,173 @@
+import os
+import subprocess
+import numpy as np
+from gcode_parser import KIND_G, iter_program_chunks
+
+ARDUINO_SKETCH_HEADER = """
+// Dichiarazione delle funzioni
+void blink(int x, int y, int z);
+void turnOnPin(int pin, int duration);
+void turnOnAnalogPin(int pin, int duration);
+
+// Configurazione iniziale
+void setup() {
+  pinMode(13, OUTPUT);  // Pin per il controllo
+  Serial.begin(115200);  // Inizializza la comunicazione seriale
+}
+
+// Funzioni di utilità
+void blink(int x, int y, int z) {
+  int onTime = y * 1000;  // Converti in millisecondi
+  int offTime = z * 1000; // Converti in millisecondi
+
+  for (int i = 0; i < x; i++) {
+    digitalWrite(13, HIGH); // Accendi il pin
+    delay(onTime);          // Aspetta il tempo di accensione
+    digitalWrite(13, LOW);  // Spegni il pin
+    delay(offTime);         // Aspetta il tempo di spegnimento
+  }
+}
+
+void turnOnPin(int pin, int duration) {
+  pinMode(pin, OUTPUT);
+  digitalWrite(pin, HIGH);
+  delay(duration * 1000); // Converti in millisecondi
+  digitalWrite(pin, LOW);
+}
+
+void turnOnAnalogPin(int pin, int duration) {
+  pinMode(pin, OUTPUT);
+  analogWrite(pin, 255); // Imposta il valore analogico massimo
+  delay(duration * 1000); // Converti in millisecondi
+  analogWrite(pin, 0); // Spegni il pin analogico
+}
+
+void loop() {
+"""
+
+ARDUINO_SKETCH_FOOTER = """
+}
+"""
+
+
+def translate_gcode(app):
+    """Traduci il programma G-code selezionato in un programma Arduino."""
+    selected_program_index = app.program_listbox.curselection()
+    if not selected_program_index:
+        app.show_message("Errore: Nessun programma selezionato", "error")
+        return
+
+    program_path = app.program_listbox.get(selected_program_index[0])
+    if not program_path.endswith('.gcode'):
+        app.show_message("Errore: Seleziona un file G-code", "error")
+        return
+
+    translate_gcode_to_arduino(app, program_path)
+
+
+def translate_gcode_to_arduino(app, program_path):
+    """Traduci un programma G-code in comandi Arduino e scrivilo in un file .ino."""
+    if not os.path.isfile(program_path):
+        app.show_message(f"Errore: Il file {program_path} non esiste.", "error")
+        return None
+
+    try:
+        arduino_file_path = write_arduino_sketch(program_path, arduino_file_sketch_parts(program_path))
+        app.show_message(f"Programma tradotto e salvato in {arduino_file_path}", "info")
+        return arduino_file_path
+    except Exception as e:
+        app.show_message(f"Errore: Impossibile tradurre il programma G-code: {e}", "error")
+        return None
+
+
+def write_arduino_sketch(program_path, arduino_code):
+    """Scrive lo sketch (stringa o sequenza di parti) in <nome>/<nome>.ino accanto al programma."""
+    base_name = os.path.splitext(os.path.basename(program_path))[0]
+    sketch_folder = os.path.join(os.path.dirname(program_path), base_name)
+    os.makedirs(sketch_folder, exist_ok=True)
+
+    arduino_file_path = os.path.join(sketch_folder, f"{base_name}.ino")
+    if isinstance(arduino_code, str):
+        arduino_code = [arduino_code]
+    with open(arduino_file_path, 'w') as arduino_file:
+        arduino_file.writelines(arduino_code)
+    return arduino_file_path
+
+
+def _format_word(value):
+    """Valore di una parola G-code per lo sketch: 4 decimali (come il G-code), senza zeri finali."""
+    text = f"{value:.4f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def arduino_commands(program):
+    """Genera i comandi Arduino corrispondenti ai blocchi di un programma compilato."""
+    blocks = program.blocks
+    for block in blocks[blocks['kind'] == KIND_G]:
+        code = block['code']
+        if code == 1:
+            if not np.isnan(block['x']) and not np.isnan(block['y']) and not np.isnan(block['z']):
+                yield f"  blink({_format_word(block['x'])}, {_format_word(block['y'])}, {_format_word(block['z'])});\n"
+        elif code in (2, 3):
+            if not np.isnan(block['x']) and not np.isnan(block['y']):
+                function = 'turnOnPin' if code == 2 else 'turnOnAnalogPin'
+                yield f"  {function}({_format_word(block['x'])}, {_format_word(block['y'])});\n"
+
+
+def arduino_sketch_parts(program):
+    """Genera lo sketch Arduino di un programma compilato come sequenza di parti di testo."""
+    yield ARDUINO_SKETCH_HEADER
+    yield from arduino_commands(program)
+    yield ARDUINO_SKETCH_FOOTER
+
+
+def arduino_file_sketch_parts(program_path):
+    """Genera lo sketch Arduino di un file .gcode leggendolo a blocchi, con memoria limitata."""
+    yield ARDUINO_SKETCH_HEADER
+    for chunk in iter_program_chunks(program_path):
+        yield from arduino_commands(chunk)
+    yield ARDUINO_SKETCH_FOOTER
+
+
+def convert_gcode_to_arduino(program):
+    """Converti i blocchi di un programma compilato in comandi Arduino."""
+    return ''.join(arduino_sketch_parts(program))
+
+
+def upload_to_arduino(app):
+    """Carica il programma selezionato su Arduino."""
+    selected_program_index = app.program_listbox.curselection()
+    if not selected_program_index:
+        app.show_message("Errore: Nessun programma selezionato", "error")
+        return
+
+    program_path = app.program_listbox.get(selected_program_index)
+    if program_path.endswith('.gcode'):
+        program_path = translate_gcode_to_arduino(app, program_path)
+        if not program_path:
+            return
+
+    if not program_path.endswith('.ino'):
+        app.show_message("Errore: Seleziona un file .ino per caricare su Arduino", "error")
+        return
+
+    try:
+        if not os.path.isfile(program_path):
+            app.show_message(f"Errore: Il file {program_path} non esiste.", "error")
+            return
+
+        arduino_cli_path = os.path.join(os.path.dirname(__file__), 'arduino-cli', 'arduino-cli.exe')
+        sketch_dir = os.path.dirname(program_path)
+
+        compile_result = subprocess.run([arduino_cli_path, "compile", "--fqbn", "arduino:avr:uno", sketch_dir], capture_output=True, text=True)
+        if compile_result.returncode != 0:
+            app.show_message(f"Errore durante la compilazione: {compile_result.stderr}", "error")
+            return
+
+        upload_result = subprocess.run([arduino_cli_path, "upload", "-p", "COM3", "--fqbn", "arduino:avr:uno", sketch_dir], capture_output=True, text=True)
+        if upload_result.returncode == 0:
+            app.show_message("Programma caricato su Arduino con successo", "info")
+        else:
+            app.show_message(f"Errore durante il caricamento: {upload_result.stderr}", "error")
+    except Exception as e:
+        app.show_message(f"Errore: Impossibile caricare il programma su Arduino: {e}", "error")
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from arduino_operations import arduino_sketch_parts, write_arduino_sketch
+from gcode_parser import validate_program
+from motion_planner import plan_motion
+from program_cache import load_cached_program
+from simulation_engine import SimulationEngine
+
+
+def find_programs(directory):
+    """Percorsi ordinati dei file .gcode presenti nella cartella."""
+    return sorted(
+        os.path.join(directory, file_name)
+        for file_name in os.listdir(directory)
+        if file_name.endswith('.gcode')
+    )
+
+
+def check_program(program_path, translate=True, simulate=False):
+    """Valida (ed eventualmente traduce e simula) un programma; restituisce il risultato come dizionario."""
+    result = {'program': program_path, 'status': 'ok', 'error': None, 'arduino_file': None}
+    started = time.perf_counter()
+    try:
+        program, toolpath = load_cached_program(program_path)
+        try:
+            valid, error_message = validate_program(program)
+            result['lines'] = len(program)
+            result['validation_time'] = time.perf_counter() - started
+            estimate_started = time.perf_counter()
+            result['cycle_time'] = plan_motion(toolpath).total_time
+            result['estimate_time'] = time.perf_counter() - estimate_started
+            if simulate:
+                # Simulazione completa senza grafica, alla massima velocità
+                simulation_started = time.perf_counter()
+                engine = SimulationEngine(program, toolpath)
+                engine.run()
+                result.update(engine.summary())
+                result['simulation_time'] = time.perf_counter() - simulation_started
+            if not valid:
+                result['status'] = 'invalid'
+                result['error'] = error_message
+            elif translate:
+                translation_started = time.perf_counter()
+                result['arduino_file'] = write_arduino_sketch(program_path, arduino_sketch_parts(program))
+                result['translation_time'] = time.perf_counter() - translation_started
+        finally:
+            program.close()
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['total_time'] = time.perf_counter() - started
+    return result
+
+
+def check_directory(directory, translate=True, workers=None, simulate=False):
+    """Controlla tutti i programmi della cartella su più processi, nell'ordine dei file."""
+    programs = find_programs(directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(check_program, programs, [translate] * len(programs), [simulate] * len(programs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida e traduce in parallelo i programmi G-code di una cartella.")
+    parser.add_argument('directory', help="cartella contenente i file .gcode")
+    parser.add_argument('--report', default='report.json', help="file JSON del report (default: report.json)")
+    parser.add_argument('--workers', type=int, default=None, help="numero di processi (default: tutti i core)")
+    parser.add_argument('--no-translate', action='store_true', help="valida soltanto, senza generare gli sketch Arduino")
+    parser.add_argument('--simulate', action='store_true', help="simula ogni programma e riporta ingombro e avvisi")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = check_directory(args.directory, translate=not args.no_translate, workers=args.workers, simulate=args.simulate)
+    report = {
+        'directory': os.path.abspath(args.directory),
+        'programs': len(results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'warnings': sum(len(result.get('warnings', ())) for result in results),
+        'elapsed_time': time.perf_counter() - started,
+        'results': results,
+    }
+    with open(args.report, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=2, ensure_ascii=False)
+
+    print(f"{report['programs']} programmi controllati, {report['failed']} con errori. Report: {args.report}")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
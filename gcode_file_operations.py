@@ -1,7 +1,11 @@
 import os
-import re
 import tkinter as tk
 from tkinter import ttk
+from live_validation import LiveValidator
+from program_cache import invalidate_program_cache
+
+# Dimensione (in caratteri) dei blocchi letti dal file nel form di modifica
+TEXT_CHUNK_SIZE = 64 * 1024
 
 def load_existing_programs(app):
     """Carica i programmi G-code dalla cartella corrente."""
@@ -26,6 +30,7 @@ def show_new_program_form(app):
     ttk.Label(app.left_frame, text="Istruzioni G-code:").pack(pady=10)
     app.gcode_text = tk.Text(app.left_frame, width=40, height=10)
     app.gcode_text.pack(pady=10)
+    attach_live_validation(app)
 
     app.save_button = ttk.Button(app.left_frame, text="Salva Programma", command=app.save_new_program)
     app.save_button.pack(pady=10)
@@ -58,12 +63,12 @@ def show_edit_program_form(app, program_path):
     """Mostra il form per modificare un programma esistente."""
     ttk.Label(app.left_frame, text=f"Modifica Programma: {os.path.basename(program_path)}").pack(pady=10)
 
-    with open(program_path, 'r') as file:
-        gcode_instructions = file.read()
-
     app.gcode_text = tk.Text(app.left_frame, width=40, height=10)
-    app.gcode_text.insert(tk.END, gcode_instructions)
+    with open(program_path, 'r') as file:
+        for text_chunk in iter(lambda: file.read(TEXT_CHUNK_SIZE), ''):
+            app.gcode_text.insert(tk.END, text_chunk)
     app.gcode_text.pack(pady=10)
+    attach_live_validation(app)
 
     app.save_button = ttk.Button(app.left_frame, text="Salva Modifiche", command=lambda: save_edited_program(app, program_path))
     app.save_button.pack(pady=10)
@@ -82,12 +87,13 @@ def save_new_program(app):
         app.show_message("Errore: Nome del programma e istruzioni G-code non possono essere vuoti.", "error")
         return
 
-    valid, error_message = validate_gcode(gcode_instructions)
+    valid, error_message = app.gcode_validator.validate()
     if not valid:
         app.show_message(f"Errore: {error_message}", "error")
         return
 
     gcode_file_path = os.path.join(os.path.dirname(__file__), f"{program_name}.gcode")
+    invalidate_program_cache(gcode_file_path)
     with open(gcode_file_path, 'w') as gcode_file:
         gcode_file.write(gcode_instructions)
 
@@ -105,11 +111,12 @@ def save_edited_program(app, program_path):
         app.show_message("Errore: Le istruzioni G-code non possono essere vuote.", "error")
         return
 
-    valid, error_message = validate_gcode(gcode_instructions)
+    valid, error_message = app.gcode_validator.validate()
     if not valid:
         app.show_message(f"Errore: {error_message}", "error")
         return
 
+    invalidate_program_cache(program_path)
     with open(program_path, 'w') as gcode_file:
         gcode_file.write(gcode_instructions)
 
@@ -118,18 +125,17 @@ def save_edited_program(app, program_path):
     app.show_message(f"Modifiche salvate in {program_path}", "info")
     app.show_graph()
 
-def validate_gcode(gcode):
-    """Valida le istruzioni G-code."""
-    valid_commands = {"G0", "G1", "G2", "G3", "G4", "G17", "G18", "G19", "G20", "G21", "G28", "G30", "G90", "G91", "G92", "G00", "G01", "M30"}
-    for line_num, line in enumerate(gcode.splitlines(), start=1):
-        line = line.strip()
-        if not line:
-            continue
-        match = re.match(r'^(G\d+|M\d+)', line)
-        if match and match.group(1) in valid_commands:
-            continue
-        return False, f"L'istruzione '{line}' alla linea {line_num} non è valida."
-    return True, ""
+def attach_live_validation(app):
+    """Collega al campo di testo la validazione incrementale con evidenziazione degli errori."""
+    app.gcode_validator = LiveValidator(app.gcode_text, on_change=lambda: show_validation_status(app))
+
+def show_validation_status(app):
+    """Mostra il primo errore del programma in modifica, oppure conferma che è valido."""
+    valid, error_message = app.gcode_validator.validate()
+    if valid:
+        app.show_message("Istruzioni G-code valide", "info")
+    else:
+        app.show_message(f"Errore: {error_message}", "error")
 
 def cancel_new_program(app):
     """Annulla la creazione o modifica di un programma."""
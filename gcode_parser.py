@@ -0,0 +1,181 @@
+import re
+from itertools import islice
+import numpy as np
+from program_file import MappedProgramFile
+
+# Versione del formato dei blocchi compilati (da incrementare se cambia PROGRAM_DTYPE o il parsing)
+PARSER_VERSION = 3
+
+# Numero di linee compilate per ogni blocco in lettura incrementale
+CHUNK_SIZE = 4096
+
+# Comandi G-code accettati dal validatore
+VALID_COMMANDS = {"G0", "G1", "G2", "G3", "G4", "G17", "G18", "G19", "G20", "G21", "G28", "G30", "G90", "G91", "G92", "G00", "G01", "M30"}
+
+# Tipo di comando della linea
+KIND_NONE = 0
+KIND_G = 1
+KIND_M = 2
+
+# Flag di stato e modali di ogni blocco
+FLAG_VALID = 1      # Linea vuota o comando riconosciuto con parole numeriche valide
+FLAG_RELATIVE = 2   # G91 attivo (coordinate incrementali)
+FLAG_INCHES = 4     # G20 attivo (unità in pollici)
+
+# Parole G-code memorizzate come colonne (NaN se assenti nella linea)
+WORD_FIELDS = ('x', 'y', 'z', 'f', 'i', 'j', 'r')
+
+PROGRAM_DTYPE = np.dtype([
+    ('kind', np.uint8),
+    ('code', np.int16),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('z', np.float64),
+    ('f', np.float64),
+    ('i', np.float64),
+    ('j', np.float64),
+    ('r', np.float64),
+    ('flags', np.uint8),
+])
+
+_COMMAND_RE = re.compile(r'^(G\d+|M\d+)')
+# Parole lettera-valore, anche senza spazi tra una parola e l'altra (es. G1X10Y5); il valore è
+# vuoto se non è un numero decimale semplice (niente esponenti, nan, inf o separatori)
+_WORD_RE = re.compile(r'([A-Z])([+-]?(?:\d+\.?\d*|\.\d+)(?![^A-Z\s]))?')
+# Commenti tra parentesi o dopo il punto e virgola, ignorati come fa GRBL
+_COMMENT_RE = re.compile(r'\([^)]*\)|;.*')
+_MAX_CODE = np.iinfo(PROGRAM_DTYPE['code']).max
+_WORD_INDEX = {field.upper(): n for n, field in enumerate(WORD_FIELDS)}
+_EMPTY_WORDS = (np.nan,) * len(WORD_FIELDS)
+
+
+class GCodeProgram:
+    """Programma G-code compilato: un blocco della tabella per ogni linea del sorgente."""
+
+    def __init__(self, blocks, lines, first_line=0):
+        self.blocks = blocks
+        self.lines = lines
+        self.first_line = first_line  # Indice nel file della prima linea (per i blocchi in streaming)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def line(self, index):
+        """Restituisce il testo della linea di indice index."""
+        return self.lines[index].strip()
+
+    def close(self):
+        """Rilascia il file sorgente, se il programma è mappato in memoria."""
+        close = getattr(self.lines, 'close', None)
+        if close is not None:
+            close()
+
+    def first_error(self):
+        """Indice della prima linea non valida, oppure None."""
+        invalid = np.flatnonzero((self.blocks['flags'] & FLAG_VALID) == 0)
+        return int(invalid[0]) if invalid.size else None
+
+
+def _parse_line(raw, modal):
+    """Compila una linea, restituisce la riga della tabella e il nuovo stato modale."""
+    line = raw.strip()
+    if not line:
+        return (KIND_NONE, 0) + _EMPTY_WORDS + (modal | FLAG_VALID,), modal
+
+    match = _COMMAND_RE.match(line)
+    if not match:
+        return (KIND_NONE, 0) + _EMPTY_WORDS + (modal,), modal
+
+    command = match.group(1)
+    code = int(command[1:])
+    if code > _MAX_CODE:
+        # Codice fuori dal campo della tabella: la linea non è valida
+        return (KIND_NONE, 0) + _EMPTY_WORDS + (modal,), modal
+    kind = KIND_G if command[0] == 'G' else KIND_M
+    valid = command in VALID_COMMANDS
+
+    words = list(_EMPTY_WORDS)
+    rest = line[match.end():]
+    if '(' in rest or ';' in rest:
+        rest = _COMMENT_RE.sub(' ', rest)
+    for letter, value in _WORD_RE.findall(rest):
+        index = _WORD_INDEX.get(letter)
+        if index is None:
+            continue
+        if value:
+            words[index] = float(value)
+        else:
+            valid = False
+
+    if kind == KIND_G:
+        if code == 90:
+            modal &= ~FLAG_RELATIVE
+        elif code == 91:
+            modal |= FLAG_RELATIVE
+        elif code == 20:
+            modal |= FLAG_INCHES
+        elif code == 21:
+            modal &= ~FLAG_INCHES
+
+    return (kind, code) + tuple(words) + (modal | (FLAG_VALID if valid else 0),), modal
+
+
+def _parse_lines(lines, modal=0):
+    """Genera le righe della tabella dei blocchi, propagando lo stato modale."""
+    for raw in lines:
+        row, modal = _parse_line(raw, modal)
+        yield row
+
+
+def parse_gcode(lines):
+    """Compila una sequenza di linee G-code in un GCodeProgram."""
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    blocks = np.fromiter(_parse_lines(lines), dtype=PROGRAM_DTYPE, count=len(lines))
+    return GCodeProgram(blocks, lines)
+
+
+def iter_program_chunks(program_path, chunk_size=CHUNK_SIZE):
+    """Legge un file .gcode in modo incrementale, generando GCodeProgram di al più chunk_size linee.
+
+    Lo stato modale (G90/G91, G20/G21) viene propagato da un blocco al successivo,
+    così il consumatore può iniziare a lavorare sul primo blocco mentre il resto è ancora su disco.
+    """
+    modal = 0
+    first_line = 0
+    with open(program_path, 'r', encoding='utf-8', errors='replace') as file:
+        while True:
+            lines = [line.rstrip('\r\n') for line in islice(file, chunk_size)]
+            if not lines:
+                return
+            blocks = np.empty(len(lines), dtype=PROGRAM_DTYPE)
+            for index, raw in enumerate(lines):
+                blocks[index], modal = _parse_line(raw, modal)
+            yield GCodeProgram(blocks, lines, first_line)
+            first_line += len(lines)
+
+
+def load_program(program_path):
+    """Mappa in memoria un file .gcode e lo compila; il testo delle linee resta sul file."""
+    lines = MappedProgramFile(program_path)
+    blocks = np.fromiter(_parse_lines(lines), dtype=PROGRAM_DTYPE, count=len(lines))
+    return GCodeProgram(blocks, lines)
+
+
+def is_valid_line(line):
+    """True se la singola linea è vuota o contiene un comando valido."""
+    row, _ = _parse_line(line, 0)
+    return bool(row[-1] & FLAG_VALID)
+
+
+def invalid_line_message(line, line_number):
+    """Messaggio di errore per una linea non valida (line_number parte da 1)."""
+    return f"L'istruzione '{line.strip()}' alla linea {line_number} non è valida."
+
+
+def validate_program(program):
+    """Valida un programma compilato, restituisce (valido, messaggio di errore)."""
+    index = program.first_error()
+    if index is None:
+        return True, ""
+    return False, invalid_line_message(program.line(index), program.first_line + index + 1)
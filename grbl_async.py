@@ -0,0 +1,245 @@
+import asyncio
+import serial
+from collections import deque
+from grbl_interface import RX_BUFFER_SIZE
+
+# Intervallo (s) tra due richieste di stato '?' a GRBL
+STATUS_INTERVAL = 0.2
+
+# Linee in coda per l'invio oltre a quelle già nel buffer di GRBL
+OUTGOING_QUEUE_SIZE = 64
+
+# Numero massimo di messaggi di GRBL (allarmi, feedback) conservati
+MAX_MESSAGES = 100
+
+
+class MachineState:
+    """Stato della macchina letto da un rapporto di stato di GRBL.
+
+    position: posizione macchina (MPos) o di lavoro (WPos) come tupla; planner_free e rx_free:
+    blocchi liberi del planner e byte liberi del buffer seriale (campo Bf, None se assente);
+    feed e spindle: avanzamento (mm/min) e giri del mandrino correnti.
+    """
+
+    def __init__(self, state, position=None, work_position=False, planner_free=None, rx_free=None, feed=None, spindle=None):
+        self.state = state
+        self.position = position
+        self.work_position = work_position
+        self.planner_free = planner_free
+        self.rx_free = rx_free
+        self.feed = feed
+        self.spindle = spindle
+
+
+def parse_status(line):
+    """Stato della macchina da un rapporto '<Idle|MPos:0.000,0.000,0.000|Bf:15,128|FS:0,0>' (None se non lo è)."""
+    line = line.strip()
+    if not (line.startswith('<') and line.endswith('>')):
+        return None
+    fields = line[1:-1].split('|')
+    status = MachineState(fields[0])
+    try:
+        for field in fields[1:]:
+            name, _, value = field.partition(':')
+            values = value.split(',')
+            if name in ('MPos', 'WPos'):
+                status.position = tuple(float(v) for v in values)
+                status.work_position = name == 'WPos'
+            elif name == 'Bf':
+                status.planner_free, status.rx_free = int(values[0]), int(values[1])
+            elif name == 'FS':
+                status.feed, status.spindle = float(values[0]), float(values[1])
+            elif name == 'F':
+                status.feed = float(values[0])
+    except (ValueError, IndexError):
+        return None
+    return status
+
+
+class GRBLAsyncClient:
+    """Client GRBL asincrono: un task legge le risposte, uno invia le linee e uno chiede lo stato.
+
+    Le linee sono inviate con il protocollo a conteggio di caratteri (come
+    GRBLController.stream_lines) e ogni 'ok'/'error' è abbinato alla linea più vecchia in attesa;
+    le richieste '?' sono comandi in tempo reale, quindi non occupano il buffer e non ricevono 'ok'.
+    Gli stati letti sono pubblicati ai callback registrati con subscribe, così interfaccia e log
+    ricevono la telemetria mentre un programma è in invio. Funziona con qualsiasi coppia
+    asyncio.StreamReader/StreamWriter (porta seriale, socket, emulatore).
+    """
+
+    def __init__(self, reader, writer, status_interval=STATUS_INTERVAL):
+        self.reader = reader
+        self.writer = writer
+        self.status_interval = status_interval
+        self.state = None
+        self.messages = deque(maxlen=MAX_MESSAGES)
+        self.ready = asyncio.Event()
+        self.disconnected = None
+        self._subscribers = []
+        self._outgoing = asyncio.Queue(OUTGOING_QUEUE_SIZE)
+        self._pending = deque()
+        self._buffered = 0
+        self._buffer_freed = asyncio.Event()
+        self._tasks = []
+
+    def subscribe(self, callback):
+        """Registra callback(client, state), chiamata a ogni rapporto di stato ricevuto."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def start(self):
+        """Avvia i task di lettura, di invio e (se status_interval > 0) di richiesta dello stato."""
+        self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._write_loop())]
+        if self.status_interval:
+            self._tasks.append(asyncio.create_task(self._status_loop()))
+
+    async def close(self):
+        """Ferma i task e chiude la connessione (da chiamare quando non ci sono invii in corso)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._disconnect('closed')
+        self.writer.close()
+
+    async def wait_ready(self, timeout):
+        """Attende il messaggio di avvio di GRBL o una risposta di stato (False se non arriva entro timeout s)."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def send(self, command):
+        """Invia una linea e restituisce la risposta di GRBL ('ok' o 'error:N')."""
+        response = asyncio.get_running_loop().create_future()
+        await self._outgoing.put((0, command.strip(), lambda index, command, text: response.done() or response.set_result(text)))
+        return await response
+
+    async def stream(self, commands, on_response=None):
+        """Invia le linee tenendo pieno il buffer di GRBL e attende tutte le risposte.
+
+        on_response(indice, linea, risposta) è chiamata per ogni risposta (le linee vuote sono
+        saltate); restituisce la lista (indice, linea, risposta) delle linee rifiutate con errore.
+        """
+        errors = []
+        sent = 0
+        answered = 0
+        done = asyncio.Event()
+
+        def receive(index, command, response):
+            nonlocal answered
+            answered += 1
+            if response != 'ok':
+                errors.append((index, command, response))
+            if on_response is not None:
+                on_response(index, command, response)
+            if answered == sent:
+                done.set()
+
+        for index, command in enumerate(commands):
+            command = command.strip()
+            if command:
+                sent += 1
+                await self._outgoing.put((index, command, receive))
+        if answered < sent:
+            await done.wait()
+        return errors
+
+    async def _write_loop(self):
+        while True:
+            index, command, callback = await self._outgoing.get()
+            data = f"{command}\n".encode()
+            while self._pending and self._buffered + len(data) > RX_BUFFER_SIZE:
+                self._buffer_freed.clear()
+                await self._buffer_freed.wait()
+            if self.disconnected is not None:
+                callback(index, command, self.disconnected)
+                continue
+            self._pending.append((index, command, len(data), callback))
+            self._buffered += len(data)
+            try:
+                self.writer.write(data)
+                await self.writer.drain()
+            except (OSError, serial.SerialException) as e:
+                self._disconnect(e)
+
+    async def _status_loop(self):
+        while self.disconnected is None:
+            try:
+                self.writer.write(b'?')
+                await self.writer.drain()
+            except (OSError, serial.SerialException) as e:
+                self._disconnect(e)
+                return
+            await asyncio.sleep(self.status_interval)
+
+    async def _read_loop(self):
+        while True:
+            try:
+                line = await self.reader.readline()
+            except (OSError, serial.SerialException) as e:
+                self._disconnect(e)
+                return
+            if not line or not line.endswith(b'\n'):
+                # Fine del flusso (anche a metà linea): la porta è stata chiusa
+                self._disconnect('disconnected')
+                return
+            response = line.strip().decode(errors='replace')
+            if response == 'ok' or response.startswith('error'):
+                self._answer(response)
+            elif response.startswith('<'):
+                status = parse_status(response)
+                if status is not None:
+                    self.state = status
+                    self.ready.set()
+                    for callback in self._subscribers:
+                        callback(self, status)
+            elif response.startswith('Grbl '):
+                # GRBL si è (ri)avviato: le linee in attesa sono state perse
+                self._fail_pending(response)
+                self.ready.set()
+            elif response:
+                self.messages.append(response)
+
+    def _answer(self, response):
+        if not self._pending:
+            return
+        index, command, length, callback = self._pending.popleft()
+        self._buffered -= length
+        self._buffer_freed.set()
+        callback(index, command, response)
+
+    def _fail_pending(self, response):
+        while self._pending:
+            self._answer(response)
+
+    def _disconnect(self, reason):
+        """Connessione persa o chiusa: le linee in attesa e quelle in coda ricevono il motivo.
+
+        reason è un testo ('closed', 'disconnected') o l'eccezione della porta; i chiamanti di
+        send e stream ricevono 'disconnected: <errore>' invece di restare in attesa.
+        """
+        response = reason if isinstance(reason, str) else f"disconnected: {reason}"
+        if self.disconnected is None:
+            self.disconnected = response
+        response = self.disconnected
+        self._fail_pending(response)
+        while not self._outgoing.empty():
+            index, command, callback = self._outgoing.get_nowait()
+            callback(index, command, response)
+
+
+async def open_grbl(port, baudrate=115200, status_interval=STATUS_INTERVAL, timeout=5.0):
+    """Apre la porta seriale con pyserial-asyncio, avvia il client e attende che GRBL sia pronto."""
+    import serial_asyncio  # dipendenza opzionale, necessaria solo per le porte seriali
+
+    reader, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate)
+    client = GRBLAsyncClient(reader, writer, status_interval)
+    client.start()
+    if not await client.wait_ready(timeout):
+        await client.close()
+        raise TimeoutError(f"GRBL non risponde sulla porta {port}")
+    return client
@@ -0,0 +1,331 @@
+import argparse
+import math
+import os
+import pty
+import select
+import sys
+import threading
+import time
+import tty
+from collections import deque
+from gcode_parser import FLAG_VALID, KIND_G, WORD_FIELDS, _WORD_RE, _parse_line
+from grbl_interface import RX_BUFFER_SIZE, GRBLController
+from motion_planner import PLANNER_WINDOW
+from toolpath import RAPID_FEED_RATE
+
+# Messaggio di avvio inviato all'apertura e dopo ogni reset
+GRBL_BANNER = "Grbl 1.1h ['$' for help]"
+
+# Attesa massima (s) del ciclo dell'emulatore quando non ci sono blocchi da completare
+IDLE_POLL = 0.05
+
+_MM_PER_INCH = 25.4
+
+# Codici di errore di GRBL usati dall'emulatore
+_ERROR_UNSUPPORTED = 'error:20'
+_ERROR_UNDEFINED_FEED = 'error:22'
+
+
+class _Block:
+    """Movimento nel planner dell'emulatore: posizioni iniziale e finale, avanzamento (mm/min) e durata (s)."""
+
+    def __init__(self, start, end, feed, duration):
+        self.start = start
+        self.end = end
+        self.feed = feed
+        self.duration = duration
+        self.finish_time = None
+
+
+class GRBLEmulator:
+    """GRBL simulato su uno pseudo-terminale Linux, per provare l'invio senza una scheda collegata.
+
+    Modella il buffer seriale di rx_buffer_size byte (i byte in eccesso vanno persi e sono
+    contati in overflows), il planner di planner_size blocchi e la durata di ogni movimento
+    ricavata da lunghezza e avanzamento (senza accelerazioni), moltiplicata per time_scale.
+    Come GRBL, una linea viene letta dal buffer e confermata con 'ok' solo quando c'è posto nel
+    planner; risponde anche a '?' con un rapporto di stato e, come una scheda Arduino che si riavvia
+    all'apertura della porta, invia il messaggio di avvio a ogni nuova connessione e dopo Ctrl-X.
+    starvations e starved_time contano le volte (e i secondi) in cui il planner è rimasto vuoto
+    tra due movimenti, cioè le pause che sulla macchina vera si vedono come scatti. latency (s)
+    ritarda ogni risposta come il collegamento USB-seriale di una scheda reale.
+    """
+
+    def __init__(self, time_scale=1.0, planner_size=PLANNER_WINDOW, rx_buffer_size=RX_BUFFER_SIZE, latency=0.0):
+        self.time_scale = time_scale
+        self.latency = latency
+        self.planner_size = planner_size
+        self.rx_buffer_size = rx_buffer_size
+        self.port = None
+        self._master = None
+        self._connected = False
+        self._thread = None
+        self._running = False
+        self.reset()
+
+    def reset(self):
+        """Riporta l'emulatore allo stato di accensione (buffer e planner vuoti, statistiche azzerate)."""
+        self.rx_buffer = bytearray()
+        self._replies = deque()
+        self.planner = deque()
+        self.position = (0.0, 0.0, 0.0)
+        self.feed = 0.0
+        self.motion = 0
+        self.relative = False
+        self.inches = False
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Azzera i contatori (linee, errori, byte persi, pause del planner, tempo di moto)."""
+        self.lines = 0
+        self.errors = 0
+        self.overflows = 0
+        self.starvations = 0
+        self.starved_time = 0.0
+        self.busy_time = 0.0
+        self._idle_since = None
+
+    def start(self):
+        """Apre lo pseudo-terminale (il percorso è in port) e avvia il thread dell'emulatore."""
+        self._master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        # Finché nessun client apre la porta la lettura dal master fallisce: così si riconosce la connessione
+        os.close(slave)
+        self._connected = False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Ferma il thread e chiude lo pseudo-terminale."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+
+    def status_report(self, now=None):
+        """Rapporto di stato come quello di GRBL 1.1 (posizione, spazio libero nei buffer, avanzamento)."""
+        now = time.monotonic() if now is None else now
+        position = self.position
+        feed = 0.0
+        if self.planner:
+            block = self.planner[0]
+            done = 1.0 - max(block.finish_time - now, 0.0) / block.duration if block.duration else 1.0
+            position = tuple(a + (b - a) * done for a, b in zip(block.start, block.end))
+            feed = block.feed
+        state = 'Run' if self.planner else 'Idle'
+        coordinates = ','.join(f"{value:.3f}" for value in position)
+        return (f"<{state}|MPos:{coordinates}|Bf:{self.planner_size - len(self.planner)},"
+                f"{self.rx_buffer_size - len(self.rx_buffer)}|FS:{feed:.0f},0>")
+
+    def _run(self):
+        while self._running:
+            now = time.monotonic()
+            self._execute(now)
+            self._parse_lines(now)
+            while self._replies and self._replies[0][0] <= now:
+                self._write(self._replies.popleft()[1])
+            timeout = IDLE_POLL
+            if self.planner:
+                timeout = min(max(self.planner[0].finish_time - now, 0.0), timeout)
+            if self._replies:
+                timeout = min(max(self._replies[0][0] - now, 0.0), timeout)
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            if not readable:
+                self._connect()
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                # Nessun client ha la porta aperta
+                self._connected = False
+                time.sleep(IDLE_POLL)
+                continue
+            self._connect()
+            self._receive(data, time.monotonic())
+
+    def _connect(self):
+        """Alla prima attività di un nuovo client GRBL si riavvia e invia il messaggio di avvio."""
+        if not self._connected:
+            self._connected = True
+            self.reset()
+            self._write(f"\r\n{GRBL_BANNER}\r\n")
+
+    def _receive(self, data, now):
+        for byte in data:
+            if byte == ord('?'):
+                self._reply(self.status_report(now), now)
+            elif byte == 0x18:
+                self.reset()
+                self._write(f"\r\n{GRBL_BANNER}\r\n")
+            elif len(self.rx_buffer) < self.rx_buffer_size:
+                self.rx_buffer.append(byte)
+            else:
+                self.overflows += 1
+
+    def _execute(self, now):
+        """Completa i blocchi del planner terminati entro now."""
+        while self.planner and self.planner[0].finish_time <= now:
+            block = self.planner.popleft()
+            self.position = block.end
+            self.busy_time += block.duration
+            if not self.planner:
+                self._idle_since = block.finish_time
+
+    def _parse_lines(self, now):
+        """Legge dal buffer seriale le linee complete finché il planner ha posto, rispondendo a ognuna."""
+        while len(self.planner) < self.planner_size:
+            end = self.rx_buffer.find(b'\n')
+            if end < 0:
+                return
+            line = self.rx_buffer[:end].decode(errors='replace').strip()
+            del self.rx_buffer[:end + 1]
+            self.lines += 1
+            response = self._interpret(line, now)
+            if response != 'ok':
+                self.errors += 1
+            self._reply(response, now)
+
+    def _interpret(self, line, now):
+        """Esegue una linea (aggiornando lo stato modale e il planner) e restituisce la risposta."""
+        if not line or line.startswith('$'):
+            return 'ok'
+        # Stesso parser del validatore, quindi anche linee senza spazi come G1X10Y5F100
+        row, _ = _parse_line(line, 0)
+        if not row[-1] & FLAG_VALID:
+            return _ERROR_UNSUPPORTED
+        if row[0] != KIND_G:
+            return 'ok'
+        code = row[1]
+        words = {field.upper(): value for field, value in zip(WORD_FIELDS, row[2:-1]) if not math.isnan(value)}
+        scale = _MM_PER_INCH if self.inches else 1.0
+        if 'F' in words:
+            self.feed = words['F'] * scale
+        if code in (0, 1, 2, 3):
+            self.motion = code
+        elif code == 90 or code == 91:
+            self.relative = code == 91
+        elif code == 20 or code == 21:
+            self.inches = code == 20
+        elif code == 4:
+            dwell = next((float(value) for letter, value in _WORD_RE.findall(line) if letter == 'P' and value), 0.0)
+            self._plan(_Block(self._target(), self._target(), 0.0, dwell), now)
+        if code not in (0, 1, 2, 3):
+            return 'ok'
+
+        start = self._target()
+        end = tuple(
+            (start[n] if self.relative else 0.0) + words[axis] * scale if axis in words else start[n]
+            for n, axis in enumerate('XYZ')
+        )
+        length = math.dist(start, end)
+        if self.motion in (2, 3):
+            length = self._arc_length(start, end, words, scale)
+        if self.motion == 0:
+            feed = RAPID_FEED_RATE
+        elif self.feed > 0:
+            feed = self.feed
+        else:
+            return _ERROR_UNDEFINED_FEED
+        self._plan(_Block(start, end, feed, length / feed * 60.0), now)
+        return 'ok'
+
+    def _target(self):
+        """Posizione alla fine dell'ultimo movimento accettato."""
+        return self.planner[-1].end if self.planner else self.position
+
+    def _arc_length(self, start, end, words, scale):
+        """Lunghezza di un arco G2/G3 nel piano XY (centro da I/J o raggio da R)."""
+        chord = math.dist(start[:2], end[:2])
+        if 'R' in words:
+            radius = abs(words['R'] * scale)
+            return 2.0 * radius * math.asin(min(chord / (2.0 * radius), 1.0)) if radius else chord
+        cx, cy = start[0] + words.get('I', 0.0) * scale, start[1] + words.get('J', 0.0) * scale
+        radius = math.hypot(start[0] - cx, start[1] - cy)
+        angle = math.atan2(end[1] - cy, end[0] - cx) - math.atan2(start[1] - cy, start[0] - cx)
+        if self.motion == 2:
+            angle = -angle
+        angle %= 2.0 * math.pi
+        if angle == 0.0:
+            angle = 2.0 * math.pi  # Arco con partenza e arrivo coincidenti: cerchio completo
+        return radius * angle
+
+    def _plan(self, block, now):
+        block.duration *= self.time_scale
+        if self.planner:
+            block.finish_time = self.planner[-1].finish_time + block.duration
+        else:
+            if self._idle_since is not None:
+                self.starvations += 1
+                self.starved_time += now - self._idle_since
+            block.finish_time = now + block.duration
+        self.planner.append(block)
+
+    def _reply(self, text, now):
+        """Invia una risposta dopo latency secondi."""
+        if self.latency:
+            self._replies.append((now + self.latency, text + "\r\n"))
+        else:
+            self._write(text + "\r\n")
+
+    def _write(self, text):
+        try:
+            os.write(self._master, text.encode())
+        except OSError:
+            pass
+
+
+def benchmark(program_path, time_scale=1.0, stream=True, latency=0.0):
+    """Invia un programma all'emulatore con GRBLController e ne misura tempi e pause del planner."""
+    emulator = GRBLEmulator(time_scale, latency=latency)
+    emulator.start()
+    try:
+        controller = GRBLController(emulator.port)
+        try:
+            emulator.reset_statistics()
+            started = time.perf_counter()
+            controller.send_program(program_path, stream=stream)
+            # Il programma termina quando la macchina ha eseguito anche l'ultimo blocco
+            while emulator.planner:
+                time.sleep(IDLE_POLL)
+            elapsed = time.perf_counter() - started
+        finally:
+            controller.close()
+    finally:
+        emulator.stop()
+    return {
+        'program': program_path,
+        'stream': stream,
+        'lines': emulator.lines,
+        'errors': emulator.errors,
+        'overflows': emulator.overflows,
+        'elapsed_time': elapsed,
+        'lines_per_second': emulator.lines / elapsed if elapsed else 0.0,
+        'machine_time': emulator.busy_time,
+        'starvations': emulator.starvations,
+        'starved_time': emulator.starved_time,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Misura l'invio di un programma G-code a un GRBL emulato.")
+    parser.add_argument('program', help="file .gcode da inviare")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="fattore sulla durata dei movimenti (default: 1)")
+    parser.add_argument('--latency', type=float, default=0.0, help="ritardo (s) di ogni risposta, come un collegamento USB (default: 0)")
+    parser.add_argument('--line-by-line', action='store_true', help="attende ogni 'ok' prima della linea successiva")
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.program, args.time_scale, stream=not args.line_by_line, latency=args.latency)
+    print(f"{result['lines']} linee in {result['elapsed_time']:.2f} s ({result['lines_per_second']:.0f} linee/s), "
+          f"macchina in moto {result['machine_time']:.2f} s, planner vuoto {result['starvations']} volte "
+          f"per {result['starved_time']:.2f} s, errori: {result['errors']}, byte persi: {result['overflows']}")
+    return 1 if result['errors'] or result['overflows'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,224 @@
+import logging
 import serial
+import threading
 import time
+from collections import deque
+from motion_planner import PLANNER_WINDOW, plan_motion
+from program_cache import load_cached_program
+
+# Dimensione (byte) del buffer di ricezione seriale di GRBL
+RX_BUFFER_SIZE = 128
+
+# Attesa massima (s) del messaggio di avvio o di una risposta di stato all'apertura della porta
+CONNECT_TIMEOUT = 5.0
+
+# Intervallo (s) tra le richieste di stato '?' mentre si attende GRBL
+STATUS_QUERY_INTERVAL = 0.5
+
+# Timeout (s) di ogni lettura dalla porta seriale
+READ_TIMEOUT = 0.1
+
+# Attesa massima (s) di una risposta: oltre, se GRBL non risponde nemmeno a '?', l'invio si interrompe
+RESPONSE_TIMEOUT = 10.0
+
+logger = logging.getLogger(__name__)
+
+# Controller aperti, per porta, riutilizzati da un lavoro all'altro
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+class GRBLError(Exception):
+    """GRBL ha perso le linee in attesa (riavvio o allarme) o non risponde; response ne indica la causa."""
+
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
 
 class GRBLController:
-    def __init__(self, port, baudrate=115200):
+    def __init__(self, port, baudrate=115200, timeout=CONNECT_TIMEOUT):
         self.port = port
         self.baudrate = baudrate
-        self.serial_connection = serial.Serial(port, baudrate)
-        self.initialize_grbl()
+        self.serial_connection = serial.Serial(port, baudrate, timeout=READ_TIMEOUT)
+        try:
+            self.initialize_grbl(timeout)
+        except Exception:
+            self.serial_connection.close()
+            raise
 
-    def initialize_grbl(self):
-        """Inizializza la connessione con GRBL."""
-        self.serial_connection.write(b"\r\n\r\n")
-        time.sleep(2)
-        self.serial_connection.flushInput()
+    def initialize_grbl(self, timeout=CONNECT_TIMEOUT):
+        """Attende che GRBL sia pronto, al massimo timeout secondi.
 
-    def send_gcode(self, gcode):
-        """Invia comandi G-code a GRBL."""
+        Le schede che si riavviano all'apertura della porta inviano il messaggio di avvio 'Grbl ...';
+        le altre rispondono a una richiesta di stato '?', inviata ogni STATUS_QUERY_INTERVAL
+        secondi. Si attende solo il tempo necessario invece di una pausa fissa.
+        """
+        connection = self.serial_connection
+        started = time.monotonic()
+        next_query = started + STATUS_QUERY_INTERVAL
+        while time.monotonic() - started < timeout:
+            response = connection.readline().strip().decode(errors='replace')
+            if response.startswith('Grbl ') or response.startswith('<'):
+                return
+            if time.monotonic() >= next_query:
+                connection.write(b"?")
+                next_query += STATUS_QUERY_INTERVAL
+        raise TimeoutError(f"GRBL non risponde sulla porta {self.port}")
+
+    @property
+    def is_open(self):
+        return self.serial_connection.is_open
+
+    def send_gcode(self, gcode, stream=False):
+        """Invia comandi G-code a GRBL (con stream=True usa il protocollo a conteggio di caratteri)."""
         if isinstance(gcode, str):
             gcode = gcode.splitlines()
+        if stream:
+            return self.stream_lines(gcode)
         for command in gcode:
-            self.serial_connection.write(f"{command}\n".encode())
-            grbl_out = self.serial_connection.readline().strip()
-            print(f"GRBL: {grbl_out.decode()}")
+            self.send_line(command)
+
+    def send_line(self, command):
+        """Invia una linea e attende la risposta di GRBL."""
+        self.serial_connection.write(f"{command}\n".encode())
+        response = self._read_response()
+        logger.debug("%s: %s", self.port, response)
+        return response
+
+    def stream_lines(self, commands, on_response=None):
+        """Invia le linee senza attendere ogni risposta, tenendo pieno il buffer di ricezione di GRBL.
+
+        Si tiene il conto dei byte inviati e non ancora confermati (fine linea compreso): una linea
+        parte appena ci sta nei RX_BUFFER_SIZE byte del buffer, altrimenti si legge prima la
+        risposta più vecchia. GRBL risponde nell'ordine di ricezione, quindi ogni 'ok' o 'error'
+        appartiene alla linea in attesa da più tempo. on_response(indice, linea, risposta) viene
+        chiamata per ogni risposta (l'indice è la posizione in commands; le linee vuote sono saltate).
+        Restituisce la lista (indice, linea, risposta) delle linee rifiutate con errore.
+
+        Se GRBL si riavvia, va in allarme o smette di rispondere, le linee in attesa ricevono come
+        risposta la causa e viene sollevata GRBLError.
+        """
+        pending = deque()
+        buffered = 0
+        errors = []
+        try:
+            for index, command in enumerate(commands):
+                command = command.strip()
+                if not command:
+                    continue
+                data = f"{command}\n".encode()
+                while pending and buffered + len(data) > RX_BUFFER_SIZE:
+                    buffered -= self._receive_response(pending, errors, on_response)
+                self.serial_connection.write(data)
+                pending.append((index, command, len(data)))
+                buffered += len(data)
+            while pending:
+                self._receive_response(pending, errors, on_response)
+        except GRBLError as e:
+            while pending:
+                index, command, _ = pending.popleft()
+                errors.append((index, command, e.response))
+                if on_response is not None:
+                    on_response(index, command, e.response)
+            raise
+        return errors
+
+    def _receive_response(self, pending, errors, on_response):
+        """Legge la prossima risposta, la abbina alla linea in attesa più vecchia e ne restituisce la lunghezza."""
+        response = self._read_response()
+        index, command, length = pending.popleft()
+        if response != 'ok':
+            logger.warning("%s: %s (%s)", self.port, response, command)
+            errors.append((index, command, response))
+        if on_response is not None:
+            on_response(index, command, response)
+        return length
+
+    def _read_response(self):
+        """Prossima risposta 'ok' o 'error:N' di GRBL.
+
+        Il messaggio di avvio e gli allarmi significano che GRBL ha svuotato i suoi buffer e le
+        risposte attese non arriveranno: si solleva GRBLError. Se una risposta tarda si chiede lo
+        stato con '?' ogni STATUS_QUERY_INTERVAL secondi, così un movimento lungo non viene scambiato
+        per una scheda bloccata; dopo RESPONSE_TIMEOUT secondi di silenzio si solleva GRBLError.
+        """
+        connection = self.serial_connection
+        last_activity = time.monotonic()
+        next_query = last_activity + STATUS_QUERY_INTERVAL
+        while True:
+            response = connection.readline().strip().decode(errors='replace')
+            now = time.monotonic()
+            if response == 'ok' or response.startswith('error'):
+                return response
+            if response.startswith('Grbl ') or response.startswith('ALARM'):
+                raise GRBLError(f"GRBL ha interrotto l'esecuzione sulla porta {self.port}: {response}", response)
+            if response:
+                # Rapporti di stato e messaggi non sono risposte alle linee inviate
+                last_activity = now
+                logger.debug("%s: %s", self.port, response)
+            elif now - last_activity > RESPONSE_TIMEOUT:
+                raise GRBLError(f"GRBL non risponde sulla porta {self.port}", 'timeout')
+            if now >= next_query:
+                connection.write(b"?")
+                next_query = now + STATUS_QUERY_INTERVAL
+
+    def send_program(self, program_path, window=PLANNER_WINDOW, on_progress=None, stream=True):
+        """Invia un file .gcode riportando il tempo rimanente stimato dal planner con lookahead.
+
+        on_progress(indice_linea, minuti_rimanenti) viene chiamata quando GRBL conferma ogni linea.
+        Con stream=True (predefinito) le linee sono inviate con stream_lines, così il planner di
+        GRBL non resta a corto di blocchi sui segmenti brevi; restituisce le linee rifiutate.
+        """
+        program, toolpath = load_cached_program(program_path)
+        try:
+            plan = plan_motion(toolpath, window)
+            if stream:
+                report = None
+                if on_progress is not None:
+                    report = lambda index, command, response: on_progress(index, plan.remaining_time(index))
+                return self.stream_lines((program.line(index) for index in range(len(program))), report)
+            for index in range(len(program)):
+                command = program.line(index)
+                if not command:
+                    continue
+                self.send_line(command)
+                if on_progress is not None:
+                    on_progress(index, plan.remaining_time(index))
+        finally:
+            program.close()
 
     def close(self):
         """Chiude la connessione seriale."""
         self.serial_connection.close()
 
+def get_controller(port, baudrate=115200, timeout=CONNECT_TIMEOUT):
+    """Controller GRBL per la porta: riusa quello già aperto e inizializzato, altrimenti si connette.
+
+    Così i lavori in sequenza sulla stessa macchina non pagano riapertura e attesa dell'avvio;
+    un controller chiuso (o aperto con un'altra velocità) viene sostituito.
+    """
+    with _controllers_lock:
+        controller = _controllers.pop(port, None)
+        if controller is not None and controller.is_open and controller.baudrate == baudrate:
+            _controllers[port] = controller
+            return controller
+    if controller is not None:
+        controller.close()
+    # La connessione avviene fuori dal lock, così più macchine si connettono in parallelo
+    controller = GRBLController(port, baudrate, timeout)
+    with _controllers_lock:
+        _controllers[port] = controller
+    return controller
+
+def close_controllers():
+    """Chiude tutti i controller aperti con get_controller."""
+    with _controllers_lock:
+        for controller in _controllers.values():
+            controller.close()
+        _controllers.clear()
+
 if __name__ == "__main__":
     port = "COM3"  # Cambia con la tua porta seriale
-    grbl = GRBLController(port)
+    grbl = get_controller(port)
     gcode_commands = [
         "G21",  # Imposta unità in millimetri
         "G90",  # Imposta modalità assoluta
@@ -37,4 +226,4 @@ if __name__ == "__main__":
         "G1 X20 Y0",  # Movimento lineare verso (20,0)
     ]
     grbl.send_gcode(gcode_commands)
-    grbl.close()
\ No newline at end of file
+    close_controllers()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+# Colore di sfondo dell'istruzione evidenziata
+HIGHLIGHT_COLOR = 'yellow'
+
+
+class InstructionView:
+    """Lista delle istruzioni di un programma che crea solo le righe visibili.
+
+    Il Listbox contiene sempre al massimo una finestra di righe lette dal programma (mappato su
+    file) e la barra di scorrimento rappresenta l'intero programma; l'istruzione evidenziata è
+    memorizzata come indice, quindi aprire, scorrere e resettare la vista costa lo stesso con
+    100 o 1.000.000 di linee.
+    """
+
+    def __init__(self, parent, program):
+        self.program = program
+        self.first = 0
+        self.rows = 1
+        self.highlighted = None
+
+        self.frame = ttk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, activestyle='none', exportselection=False, height=1)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self._line_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<MouseWheel>', self._on_mouse_wheel)
+        self.listbox.bind('<Button-4>', lambda event: self.scroll_to(self.first - 3))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll_to(self.first + 3))
+
+    def __len__(self):
+        return len(self.program)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def scroll_to(self, first):
+        """Mostra le righe a partire dall'istruzione first."""
+        first = max(0, min(first, len(self) - self.rows))
+        if first != self.first:
+            self.first = first
+            self._refresh()
+
+    def see(self, index):
+        """Scorre la vista, se serve, in modo che l'istruzione index sia visibile al centro."""
+        if not self.first <= index < self.first + self.rows:
+            self.scroll_to(index - self.rows // 2)
+
+    def highlight(self, index):
+        """Evidenzia l'istruzione index (e la rende visibile); restituisce False se lo era già."""
+        if index == self.highlighted or not 0 <= index < len(self):
+            return False
+        self._set_row_color(self.highlighted, 'white')
+        self.highlighted = index
+        self._set_row_color(index, HIGHLIGHT_COLOR)
+        self.see(index)
+        return True
+
+    def clear_highlight(self):
+        """Toglie l'evidenziazione dell'istruzione corrente."""
+        self._set_row_color(self.highlighted, 'white')
+        self.highlighted = None
+
+    def _set_row_color(self, index, color):
+        if index is not None and self.first <= index < self.first + self.listbox.size():
+            self.listbox.itemconfig(index - self.first, {'bg': color})
+
+    def _refresh(self):
+        """Ricrea le righe della finestra visibile e aggiorna la barra di scorrimento."""
+        last = min(self.first + self.rows, len(self))
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *(self.program.line(index) for index in range(self.first, last)))
+        self._set_row_color(self.highlighted, HIGHLIGHT_COLOR)
+        total = max(len(self), 1)
+        self.scrollbar.set(self.first / total, last / total)
+
+    def _on_resize(self, event):
+        self.rows = max(1, event.height // self._line_height)
+        self.first = max(0, min(self.first, len(self) - self.rows))
+        self._refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self)))
+        elif action == 'scroll':
+            step = self.rows if unit == 'pages' else 1
+            self.scroll_to(self.first + int(amount) * step)
+
+    def _on_mouse_wheel(self, event):
+        self.scroll_to(self.first - 3 * (1 if event.delta > 0 else -1))
+        return 'break'
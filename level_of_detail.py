@@ -0,0 +1,116 @@
+import numpy as np
+
+# Rapporto tra il numero di vertici di due livelli consecutivi della piramide
+LOD_FACTOR = 8
+
+# Sotto questo numero di vertici la spezzata si disegna sempre a piena risoluzione
+LOD_MIN_POINTS = 20000
+
+# Percentile delle dimensioni dei gruppi usato per confrontarle con la dimensione di un pixel
+_EXTENT_PERCENTILE = 90
+
+
+class _Level:
+    """Un livello della piramide: punti rappresentativi e ingombro di ogni gruppo di vertici."""
+
+    def __init__(self, xs, ys, group_size):
+        count = len(xs)
+        groups = -(-count // group_size)
+        padded = groups * group_size
+        gx = np.full(padded, np.nan)
+        gy = np.full(padded, np.nan)
+        gx[:count] = xs
+        gy[:count] = ys
+        gx = gx.reshape(groups, group_size)
+        gy = gy.reshape(groups, group_size)
+        missing = np.isnan(gx)
+
+        # Per ogni gruppo si tengono primo e ultimo vertice, gli estremi in X e in Y e la prima
+        # interruzione (NaN), nell'ordine originale: l'aspetto a meno di un pixel non cambia
+        low_x = np.where(missing, np.inf, gx)
+        high_x = np.where(missing, -np.inf, gx)
+        low_y = np.where(missing, np.inf, gy)
+        high_y = np.where(missing, -np.inf, gy)
+        picks = np.stack((
+            np.zeros(groups, dtype=np.int64),
+            np.argmin(low_x, axis=1), np.argmax(high_x, axis=1),
+            np.argmin(low_y, axis=1), np.argmax(high_y, axis=1),
+            np.where(missing.any(axis=1), np.argmax(missing, axis=1), 0),
+            np.full(groups, min(group_size, count) - 1, dtype=np.int64),
+        ), axis=1)
+        picks.sort(axis=1)
+        keep = np.ones(picks.shape, dtype=bool)
+        keep[:, 1:] = picks[:, 1:] != picks[:, :-1]
+        rows = np.broadcast_to(np.arange(groups)[:, None], picks.shape)
+        self.x = gx[rows[keep], picks[keep]]
+        self.y = gy[rows[keep], picks[keep]]
+        self.group = rows[keep]
+
+        # Ingombro del gruppo compreso il segmento verso il primo vertice del gruppo successivo
+        next_x = np.append(gx[1:, 0], np.nan)
+        next_y = np.append(gy[1:, 0], np.nan)
+        self.x_min = np.fmin(low_x.min(axis=1), next_x)
+        self.x_max = np.fmax(high_x.max(axis=1), next_x)
+        self.y_min = np.fmin(low_y.min(axis=1), next_y)
+        self.y_max = np.fmax(high_y.max(axis=1), next_y)
+        with np.errstate(invalid='ignore'):
+            size = np.maximum(self.x_max - self.x_min, self.y_max - self.y_min)
+        finite = np.isfinite(size)
+        self.extent = float(np.percentile(size[finite], _EXTENT_PERCENTILE)) if finite.any() else 0.0
+
+
+class LevelOfDetail:
+    """Piramide a più risoluzioni di una spezzata (NaN separa i tratti), per disegnarla velocemente.
+
+    Ogni livello raggruppa LOD_FACTOR volte più vertici del precedente e ne conserva solo gli estremi;
+    view sceglie il livello più grossolano i cui gruppi restano sotto la dimensione di un pixel e
+    restituisce solo la parte visibile, quindi il costo del disegno dipende dalla finestra e non dal
+    numero di vertici, e ingrandendo torna il pieno dettaglio.
+    """
+
+    def __init__(self, xs, ys, factor=LOD_FACTOR):
+        self.count = len(xs)
+        self.levels = [_Level(xs, ys, 1)]
+        group_size = factor
+        while group_size < self.count:
+            self.levels.append(_Level(xs, ys, group_size))
+            group_size *= factor
+
+    def level_for(self, pixel_size):
+        """Indice del livello più grossolano con gruppi non più grandi di pixel_size."""
+        best = 0
+        for index, level in enumerate(self.levels):
+            if level.extent <= pixel_size:
+                best = index
+        return best
+
+    def view(self, x_min, x_max, y_min, y_max, pixel_size):
+        """Vertici (xs, ys) da disegnare per la finestra indicata, con pixel_size in unità dei dati."""
+        level = self.levels[self.level_for(pixel_size)]
+        visible = ((level.x_max >= x_min) & (level.x_min <= x_max)
+                   & (level.y_max >= y_min) & (level.y_min <= y_max))
+        # Serve anche il primo vertice del gruppo successivo per chiudere il segmento di collegamento
+        visible[1:] |= visible[:-1]
+        points = np.flatnonzero(visible[level.group])
+        xs = level.x[points]
+        ys = level.y[points]
+        groups = level.group[points]
+        gaps = np.flatnonzero(np.diff(groups) > 1) + 1
+        if len(gaps):
+            xs = np.insert(xs, gaps, np.nan)
+            ys = np.insert(ys, gaps, np.nan)
+        # Vertici consecutivi nello stesso pixel si riducono al primo
+        cell_x = np.floor(xs / pixel_size)
+        cell_y = np.floor(ys / pixel_size)
+        keep = np.ones(len(xs), dtype=bool)
+        keep[1:] = (cell_x[1:] != cell_x[:-1]) | (cell_y[1:] != cell_y[:-1])
+        return xs[keep], ys[keep]
+
+
+def pixel_size(ax):
+    """Dimensione di un pixel dell'asse in unità dei dati (la maggiore tra X e Y)."""
+    x_min, x_max = ax.get_xlim()
+    y_min, y_max = ax.get_ylim()
+    width = max(ax.bbox.width, 1.0)
+    height = max(ax.bbox.height, 1.0)
+    return max(abs(x_max - x_min) / width, abs(y_max - y_min) / height)
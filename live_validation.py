@@ -0,0 +1,103 @@
+from gcode_parser import invalid_line_message, is_valid_line
+
+# Tag usato per evidenziare le linee non valide nel widget di testo
+ERROR_TAG = 'gcode_error'
+
+
+class LineStatusCache:
+    """Stato di validità per linea (1 = valida, 0 = non valida), aggiornabile per intervalli."""
+
+    def __init__(self, lines=()):
+        self.statuses = bytearray(is_valid_line(line) for line in lines)
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def replace_lines(self, start, old_count, new_lines):
+        """Sostituisce old_count stati da start (0-based) con quelli di new_lines; restituisce i nuovi stati."""
+        statuses = bytearray(is_valid_line(line) for line in new_lines)
+        self.statuses[start:start + old_count] = statuses
+        return statuses
+
+    def first_error(self):
+        """Indice (0-based) della prima linea non valida, oppure None."""
+        index = self.statuses.find(0)
+        return None if index < 0 else index
+
+
+class LiveValidator:
+    """Validazione incrementale di un tk.Text: ricontrolla solo le linee toccate da ogni modifica.
+
+    Il comando Tcl del widget viene sostituito da un proxy che intercetta insert/delete/replace,
+    ricava l'intervallo di linee modificato e aggiorna LineStatusCache ed evidenziazione.
+    """
+
+    def __init__(self, text_widget, on_change=None):
+        self.text = text_widget
+        self.on_change = on_change
+        self._command = text_widget._w
+        self.text.tag_configure(ERROR_TAG, background='#ffd6d6')
+        self.cache = LineStatusCache(self._get_lines(1, self._line_count()))
+        self._highlight(1, self.cache.statuses)
+
+        # Da qui in poi il widget originale risponde al nome rinominato
+        self._command = f"{text_widget._w}_orig"
+        text_widget.tk.call('rename', text_widget._w, self._command)
+        text_widget.tk.createcommand(text_widget._w, self._proxy)
+
+    def validate(self):
+        """Restituisce (valido, messaggio di errore) dallo stato in cache, senza rileggere il testo."""
+        index = self.cache.first_error()
+        if index is None:
+            return True, ""
+        return False, invalid_line_message(self._call('get', f"{index + 1}.0", f"{index + 1}.end"), index + 1)
+
+    def _call(self, *args):
+        return self.text.tk.call((self._command,) + args)
+
+    def _line_of(self, index):
+        return int(str(self._call('index', index)).split('.')[0])
+
+    def _line_count(self):
+        return self._line_of('end-1c')
+
+    def _get_lines(self, first, last):
+        return str(self._call('get', f"{first}.0", f"{last}.end")).split('\n')
+
+    def _edited_range(self, command, args):
+        """Linee (1-based) coinvolte dalla modifica prima della sua esecuzione, oppure None."""
+        if command == 'edit' and args and args[0] in ('undo', 'redo'):
+            return 1, self._line_count()  # Annulla/ripeti modificano il testo senza passare da insert/delete
+        if command not in ('insert', 'delete', 'replace') or not args:
+            return None
+        last_line = self._line_count()
+        if command == 'insert':
+            line = min(self._line_of(args[0]), last_line)
+            return line, line
+        if command == 'delete' and len(args) > 2:
+            return 1, last_line  # Più intervalli in una sola chiamata: si ricontrolla tutto
+        end = args[1] if len(args) > 1 else f"{args[0]}+1c"
+        return min(self._line_of(args[0]), last_line), min(self._line_of(end), last_line)
+
+    def _proxy(self, command, *args):
+        edited = self._edited_range(command, args)
+        if edited is None:
+            return self._call(command, *args)
+
+        lines_before = self._line_count()
+        result = self._call(command, *args)
+        first, last = edited
+        new_last = last + self._line_count() - lines_before
+
+        statuses = self.cache.replace_lines(first - 1, last - first + 1, self._get_lines(first, new_last))
+        self._highlight(first, statuses)
+        if self.on_change is not None:
+            self.on_change()
+        return result
+
+    def _highlight(self, first, statuses):
+        """Aggiorna il tag di errore sulle linee da first in poi secondo statuses."""
+        self._call('tag', 'remove', ERROR_TAG, f"{first}.0", f"{first + len(statuses) - 1}.end")
+        for offset, valid in enumerate(statuses):
+            if not valid:
+                self._call('tag', 'add', ERROR_TAG, f"{first + offset}.0", f"{first + offset}.end")
@@ -0,0 +1,201 @@
+import argparse
+import queue
+import sys
+import threading
+import time
+from grbl_interface import CONNECT_TIMEOUT, GRBLError, get_controller
+
+# Stati di un lavoro
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class Job:
+    """Programma da eseguire su una delle macchine del dispatcher.
+
+    machine è la porta che lo esegue; line e remaining_time (min) l'avanzamento dell'ultima linea
+    confermata da GRBL; rejected le linee rifiutate (indice, linea, risposta); error il motivo
+    dell'interruzione, se fallito.
+    """
+
+    def __init__(self, program_path):
+        self.program_path = program_path
+        self.status = JOB_QUEUED
+        self.machine = None
+        self.line = None
+        self.remaining_time = None
+        self.rejected = []
+        self.error = None
+        self.started = None
+        self.finished = None
+
+
+class MachineDispatcher:
+    """Distribuisce i programmi in coda alle macchine GRBL libere e li invia in parallelo.
+
+    Ogni porta ha un thread che, quando la sua macchina è libera, prende il prossimo lavoro dalla
+    coda comune e lo invia in streaming con il controller riutilizzato da get_controller. Gli
+    errori restano confinati alla macchina: un lavoro fallito non ferma le altre; una macchina
+    che non si connette viene esclusa rimettendo in coda il lavoro (non ancora iniziato) per le
+    altre, e una che si riavvia, va in allarme o smette di rispondere durante un lavoro viene
+    esclusa dopo aver segnato il lavoro come fallito.
+    on_progress(job) e on_finished(job) sono chiamate dai thread delle macchine: un'interfaccia
+    Tk deve passare i dati al proprio thread, per esempio con una coda svuotata con after().
+    """
+
+    def __init__(self, ports, baudrate=115200, timeout=CONNECT_TIMEOUT, on_progress=None, on_finished=None):
+        self.ports = list(ports)
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.jobs = []
+        self.offline = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, program_path):
+        """Mette in coda un programma e restituisce il suo Job."""
+        job = Job(program_path)
+        with self._lock:
+            self.jobs.append(job)
+            available = len(self.offline) < len(self.ports)
+            if available:
+                self._queue.put(job)
+        if not available:
+            job.status = JOB_FAILED
+            job.error = "Nessuna macchina disponibile"
+            self._finish(job)
+        return job
+
+    def start(self):
+        """Avvia un thread per ogni macchina."""
+        self._threads = [threading.Thread(target=self._run_machine, args=(port,), daemon=True) for port in self.ports]
+        for thread in self._threads:
+            thread.start()
+
+    def wait(self):
+        """Attende che tutti i lavori in coda siano terminati e restituisce la lista dei lavori."""
+        self._queue.join()
+        return self.jobs
+
+    def stop(self):
+        """Ferma i thread delle macchine dopo i lavori in corso."""
+        for thread in self._threads:
+            if thread.is_alive():
+                self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run_machine(self, port):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                controller = get_controller(port, self.baudrate, self.timeout)
+            except Exception as e:
+                # Il lavoro non è ancora iniziato: torna in coda per le altre macchine
+                self._go_offline(port, e, job)
+                self._queue.task_done()
+                return
+            try:
+                self._run_job(controller, port, job)
+            except GRBLError as e:
+                # Riavvio, allarme o scheda bloccata: il lavoro è fallito e la macchina va esclusa
+                self._go_offline(port, e)
+                return
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, controller, port, job):
+        job.machine = port
+        job.status = JOB_RUNNING
+        job.started = time.time()
+
+        def report(index, remaining_time):
+            job.line = index
+            job.remaining_time = remaining_time
+            if self.on_progress is not None:
+                self.on_progress(job)
+
+        try:
+            job.rejected = controller.send_program(job.program_path, on_progress=report)
+            job.status = JOB_FAILED if job.rejected else JOB_DONE
+            if job.rejected:
+                job.error = f"{len(job.rejected)} linee rifiutate da GRBL (prima: {job.rejected[0][1]})"
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            # La connessione potrebbe essere in uno stato incerto: il prossimo lavoro si riconnette
+            controller.close()
+            if isinstance(e, GRBLError):
+                self._finish(job)
+                raise
+        self._finish(job)
+
+    def _finish(self, job):
+        job.finished = time.time()
+        if self.on_finished is not None:
+            self.on_finished(job)
+
+    def _go_offline(self, port, error, job=None):
+        """Esclude una macchina; job (non ancora iniziato) torna in coda se resta una macchina attiva.
+
+        Rimessa in coda e controllo delle macchine attive avvengono sotto lo stesso lock, così
+        l'ultima macchina che si ferma non può lasciare in coda un lavoro che nessuno eseguirà.
+        """
+        with self._lock:
+            self.offline[port] = str(error)
+            if job is not None:
+                self._queue.put(job)
+            if len(self.offline) < len(self.ports):
+                return
+            # Nessuna macchina disponibile: falliscono tutti i lavori ancora in coda
+            failed = []
+            while True:
+                try:
+                    queued = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is not None:
+                    queued.status = JOB_FAILED
+                    queued.error = f"Nessuna macchina disponibile ({port}: {error})"
+                failed.append(queued)
+        for queued in failed:
+            if queued is not None:
+                self._finish(queued)
+            self._queue.task_done()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invia una coda di programmi G-code a più macchine GRBL in parallelo.")
+    parser.add_argument('programs', nargs='+', help="file .gcode da eseguire, nell'ordine della coda")
+    parser.add_argument('--ports', nargs='+', required=True, help="porte seriali delle macchine (es. COM3 COM4)")
+    parser.add_argument('--baudrate', type=int, default=115200, help="velocità seriale (default: 115200)")
+    args = parser.parse_args(argv)
+
+    def print_finished(job):
+        outcome = "completato" if job.status == JOB_DONE else f"fallito: {job.error}"
+        print(f"[{job.machine or '-'}] {job.program_path} {outcome}")
+
+    dispatcher = MachineDispatcher(args.ports, args.baudrate, on_finished=print_finished)
+    for program_path in args.programs:
+        dispatcher.submit(program_path)
+    dispatcher.start()
+    jobs = dispatcher.wait()
+    dispatcher.stop()
+    for port, error in dispatcher.offline.items():
+        print(f"Macchina {port} esclusa: {error}")
+    failed = sum(job.status != JOB_DONE for job in jobs)
+    print(f"{len(jobs)} programmi eseguiti, {failed} con errori.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
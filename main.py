@@ -1,10 +1,9 @@
-import os
 import tkinter as tk
 from ui_setup import setup_ui, initialize_left_frame, initialize_graph, plot_initial_graph, clear_left_frame, show_graph
 from gcode_file_operations import (
     load_existing_programs, create_new_program, edit_selected_program, save_new_program, cancel_new_program, save_edited_program
 )
-from arduino_operations import translate_gcode, upload_to_arduino
+from arduino_operations import translate_gcode, translate_gcode_to_arduino, convert_gcode_to_arduino, upload_to_arduino
 from simulation_operations import prepare_simulation, simulate_program, step_simulation
 
 class CNCApp:
@@ -70,107 +69,11 @@ class CNCApp:
 
     def translate_gcode_to_arduino(self, program_path):
         """Traduci un programma G-code in comandi Arduino e scrivilo in un file .ino."""
-        try:
-            with open(program_path, 'r') as file:
-                gcode_data = file.readlines()
-
-            arduino_commands = self.convert_gcode_to_arduino(gcode_data)
-
-            arduino_file_base = os.path.splitext(os.path.basename(program_path))[0]
-            arduino_dir = os.path.join(os.path.dirname(program_path), arduino_file_base)
-            os.makedirs(arduino_dir, exist_ok=True)
-
-            arduino_file_path = os.path.join(arduino_dir, f"{arduino_file_base}.ino")
-            with open(arduino_file_path, 'w') as arduino_file:
-                arduino_file.write(arduino_commands)
-
-            self.show_message(f"Programma tradotto e salvato in {arduino_file_path}", "info")
-            return arduino_file_path
-        except Exception as e:
-            self.show_message(f"Errore: Impossibile tradurre il programma G-code: {e}", "error")
-            return None
-
-    def convert_gcode_to_arduino(self, gcode_data):
-        """Converti le istruzioni G-code in comandi Arduino."""
-        arduino_code = """
-// Dichiarazione delle funzioni
-void blink(int x, int y, int z);
-void turnOnPin(int pin, int duration);
-void turnOnAnalogPin(int pin, int duration);
-
-// Configurazione iniziale
-void setup() {
-  pinMode(13, OUTPUT);  // Pin per il controllo
-  Serial.begin(115200);  // Inizializza la comunicazione seriale
-}
-
-// Funzioni di utilità
-void blink(int x, int y, int z) {
-  int onTime = y * 1000;  // Converti in millisecondi
-  int offTime = z * 1000; // Converti in millisecondi
-
-  for (int i = 0; i < x; i++) {
-    digitalWrite(13, HIGH); // Accendi il pin
-    delay(onTime);          // Aspetta il tempo di accensione
-    digitalWrite(13, LOW);  // Spegni il pin
-    delay(offTime);         // Aspetta il tempo di spegnimento
-  }
-}
-
-void turnOnPin(int pin, int duration) {
-  pinMode(pin, OUTPUT);
-  digitalWrite(pin, HIGH);
-  delay(duration * 1000); // Converti in millisecondi
-  digitalWrite(pin, LOW);
-}
-
-void turnOnAnalogPin(int pin, int duration) {
-  pinMode(pin, OUTPUT);
-  analogWrite(pin, 255); // Imposta il valore analogico massimo
-  delay(duration * 1000); // Converti in millisecondi
-  analogWrite(pin, 0); // Spegni il pin analogico
-}
-
-void loop() {
-"""
-        for line in gcode_data:
-            line = line.strip()
-            if line.startswith('G1'):
-                parts = line.split()
-                x = y = z = None
-                for part in parts:
-                    if part.startswith('X'):
-                        x = part[1:]
-                    elif part.startswith('Y'):
-                        y = part[1:]
-                    elif part.startswith('Z'):
-                        z = part[1:]
-                if x and y and z:
-                    arduino_code += f'  blink({x}, {y}, {z});\n'
-            elif line.startswith('G2'):
-                parts = line.split()
-                pin = duration = None
-                for part in parts:
-                    if part.startswith('X'):
-                        pin = part[1:]
-                    elif part.startswith('Y'):
-                        duration = part[1:]
-                if pin and duration:
-                    arduino_code += f'  turnOnPin({pin}, {duration});\n'
-            elif line.startswith('G3'):
-                parts = line.split()
-                pin = duration = None
-                for part in parts:
-                    if part.startswith('X'):
-                        pin = part[1:]
-                    elif part.startswith('Y'):
-                        duration = part[1:]
-                if pin and duration:
-                    arduino_code += f'  turnOnAnalogPin({pin}, {duration});\n'
-        arduino_code += """
-}
-"""
-        return arduino_code
+        return translate_gcode_to_arduino(self, program_path)
+
+    def convert_gcode_to_arduino(self, program):
+        """Converti un programma G-code compilato in comandi Arduino."""
+        return convert_gcode_to_arduino(program)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,187 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from toolpath import MOTION_RAPID, RAPID_FEED_RATE
+
+# Numero di movimenti visibili al planner (come il buffer di pianificazione di GRBL su Arduino Uno)
+PLANNER_WINDOW = 16
+
+# Segmenti più corti di questa lunghezza (mm) non influenzano il profilo di velocità
+_MIN_SEGMENT_LENGTH = 1e-9
+
+
+class MachineLimits:
+    """Limiti dinamici della macchina, con gli stessi significati delle impostazioni GRBL.
+
+    max_rate_*: velocità massima per asse (mm/min, $110/$111); acceleration_*: accelerazione
+    per asse (mm/s², $120/$121); junction_deviation: deviazione ammessa negli spigoli (mm, $11).
+    """
+
+    def __init__(self, max_rate_x=1000.0, max_rate_y=1000.0, acceleration_x=10.0, acceleration_y=10.0,
+                 junction_deviation=0.01):
+        self.max_rate_x = max_rate_x
+        self.max_rate_y = max_rate_y
+        self.acceleration_x = acceleration_x
+        self.acceleration_y = acceleration_y
+        self.junction_deviation = junction_deviation
+
+
+class CycleTimeEstimate:
+    """Tempo ciclo stimato: block_time per blocco, cumulative_time e total_time complessivo (min)."""
+
+    def __init__(self, block_time):
+        self.block_time = block_time
+        self.cumulative_time = np.cumsum(block_time)
+        self.total_time = float(self.cumulative_time[-1]) if len(block_time) else 0.0
+
+    def remaining_time(self, index):
+        """Tempo stimato (min) dalla fine del blocco index alla fine del programma."""
+        return self.total_time - float(self.cumulative_time[index])
+
+
+class MotionPlan(CycleTimeEstimate):
+    """Piano del planner a finestra: tempi per blocco (min) e profilo di velocità della spezzata.
+
+    Per il segmento tra i vertici k e k + 1 della spezzata: entry_speed, cruise_speed (velocità di
+    picco raggiunta) ed exit_speed in mm/s, acceleration in mm/s² e segment_time in s; i segmenti
+    di lunghezza nulla hanno tutto a 0.
+    """
+
+    def __init__(self, block_time, segment_time, entry_speed, cruise_speed, exit_speed, acceleration):
+        super().__init__(block_time)
+        self.segment_time = segment_time
+        self.entry_speed = entry_speed
+        self.cruise_speed = cruise_speed
+        self.exit_speed = exit_speed
+        self.acceleration = acceleration
+
+    def travelled(self, segment, elapsed):
+        """Spazio (mm) percorso nel segmento elapsed secondi dopo il suo inizio, col profilo trapezoidale."""
+        entry_speed = float(self.entry_speed[segment])
+        peak = float(self.cruise_speed[segment])
+        acceleration = float(self.acceleration[segment])
+        if not acceleration:
+            return 0.0
+        accelerate_time = (peak - entry_speed) / acceleration
+        decelerate_time = (peak - float(self.exit_speed[segment])) / acceleration
+        cruise_time = max(float(self.segment_time[segment]) - accelerate_time - decelerate_time, 0.0)
+        if elapsed <= accelerate_time:
+            return entry_speed * elapsed + 0.5 * acceleration * elapsed * elapsed
+        distance = entry_speed * accelerate_time + 0.5 * acceleration * accelerate_time * accelerate_time
+        if elapsed <= accelerate_time + cruise_time:
+            return distance + peak * (elapsed - accelerate_time)
+        elapsed = min(elapsed - accelerate_time - cruise_time, decelerate_time)
+        return distance + peak * cruise_time + peak * elapsed - 0.5 * acceleration * elapsed * elapsed
+
+
+def segment_dynamics(dx, dy, requested_rate, limits):
+    """Velocità nominale (mm/s) e accelerazione (mm/s²) di ogni segmento, limitate per asse."""
+    length = np.hypot(dx, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ux = np.abs(dx) / length
+        uy = np.abs(dy) / length
+        axis_speed = np.minimum(limits.max_rate_x / ux, limits.max_rate_y / uy) / 60.0
+        acceleration = np.minimum(limits.acceleration_x / ux, limits.acceleration_y / uy)
+    # Senza avanzamento programmato si assume la massima velocità consentita dagli assi
+    speed = np.where(requested_rate > 0, np.minimum(requested_rate / 60.0, axis_speed), axis_speed)
+    return speed, acceleration
+
+
+def junction_speed_squared(dx, dy, speed, acceleration, limits):
+    """Quadrato della velocità massima in ogni giunzione tra segmenti consecutivi (deviazione di giunzione)."""
+    length = np.hypot(dx, dy)
+    ux = dx / length
+    uy = dy / length
+    cos_theta = -(ux[:-1] * ux[1:] + uy[:-1] * uy[1:])
+    sin_theta_d2 = np.sqrt(np.maximum(0.5 * (1.0 - cos_theta), 0.0))
+    with np.errstate(divide='ignore'):
+        limit = np.minimum(acceleration[:-1], acceleration[1:]) * limits.junction_deviation * sin_theta_d2 / (1.0 - sin_theta_d2)
+    limit = np.where(cos_theta < -0.999999, np.inf, limit)  # Segmenti allineati: nessun rallentamento
+    limit = np.where(cos_theta > 0.999999, 0.0, limit)      # Inversione di direzione: arresto
+    nominal = np.minimum(speed[:-1], speed[1:])
+    return np.minimum(limit, nominal * nominal)
+
+
+def plan_speeds(junction_limit, length, acceleration):
+    """Quadrati delle velocità ai vertici compatibili con accelerazione e decelerazione.
+
+    junction_limit ha un elemento per vertice (primo e ultimo sono di solito 0). Le due passate
+    all'indietro e in avanti del planner si risolvono con minimi cumulativi, senza cicli Python.
+    """
+    reach = np.concatenate(([0.0], np.cumsum(2.0 * acceleration * length)))
+    # All'indietro: v²[k] <= v²[k+1] + 2·a·L  =>  v²[k] = min_{j>=k}(J[j] + S[j]) - S[k]
+    backward = np.minimum.accumulate((junction_limit + reach)[::-1])[::-1] - reach
+    # In avanti: v²[k+1] <= v²[k] + 2·a·L  =>  v²[k] = min_{j<=k}(B[j] - S[j]) + S[k]
+    forward = np.minimum.accumulate(backward - reach) + reach
+    return np.maximum(forward, 0.0)
+
+
+def trapezoid_profile(length, entry_speed, exit_speed, speed, acceleration):
+    """Velocità di picco (mm/s) e durata (s) di ogni segmento con profilo trapezoidale (o triangolare)."""
+    accelerate = (speed * speed - entry_speed * entry_speed) / (2.0 * acceleration)
+    decelerate = (speed * speed - exit_speed * exit_speed) / (2.0 * acceleration)
+    cruise = length - accelerate - decelerate
+    peak = np.sqrt(np.maximum((2.0 * acceleration * length + entry_speed ** 2 + exit_speed ** 2) / 2.0, 0.0))
+    peak = np.where(cruise >= 0, speed, peak)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time = (peak - entry_speed) / acceleration + (peak - exit_speed) / acceleration + np.maximum(cruise, 0.0) / speed
+    return peak, np.where(length > 0, time, 0.0)
+
+
+def polyline_segments(toolpath):
+    """Segmenti non nulli della spezzata: (dx, dy, blocco, avanzamento richiesto in mm/min, indice del segmento)."""
+    dx = np.diff(toolpath.path_x)
+    dy = np.diff(toolpath.path_y)
+    block = toolpath.path_block[1:]
+    segment = np.flatnonzero(np.hypot(dx, dy) > _MIN_SEGMENT_LENGTH)
+    dx, dy, block = dx[segment], dy[segment], block[segment]
+    rate = np.where(toolpath.motion[block] == MOTION_RAPID, RAPID_FEED_RATE, toolpath.feed[block])
+    return dx, dy, block, rate, segment
+
+
+def window_exit_limits(junction, length, acceleration, window=PLANNER_WINDOW):
+    """Quadrati delle velocità massime ai vertici con una finestra di lookahead limitata.
+
+    Il segmento k vede solo i window segmenti che iniziano con lui e suppone l'arresto alla fine
+    della finestra, come fa il controllore durante lo streaming. La passata all'indietro sulla
+    finestra di ogni segmento è un minimo su una finestra scorrevole, calcolato senza cicli Python.
+    """
+    count = len(length)
+    window = min(window, count)
+    reach = np.concatenate(([0.0], np.cumsum(2.0 * acceleration * length)))
+    # Arresto alla fine della finestra: v²[k+1] <= S[min(k+window, n)] - S[k+1]
+    limit = reach[np.minimum(np.arange(count) + window, count)]
+    if window > 1:
+        # Giunzioni nella finestra: v²[k+1] <= min_{k<j<k+window} (J[j] + S[j]) - S[k+1]
+        bound = np.concatenate((junction + reach[1:-1], np.full(window - 1, np.inf)))
+        limit = np.minimum(limit, sliding_window_view(bound, window - 1).min(axis=1))
+    return np.concatenate(([0.0], limit - reach[1:]))
+
+
+def plan_motion(toolpath, window=PLANNER_WINDOW, limits=None):
+    """Pianifica il programma con il planner a finestra, come farà il controllore durante lo streaming.
+
+    Il MotionPlan restituito guida sia la simulazione (posizione lungo il profilo di velocità) sia
+    l'ETA durante lo streaming (tempi per blocco).
+    """
+    if limits is None:
+        limits = MachineLimits()
+    count = max(len(toolpath.path_x) - 1, 0)
+    segment_time, entry_speed, cruise_speed, exit_speed, segment_acceleration = (np.zeros(count) for _ in range(5))
+    dx, dy, block, rate, segment = polyline_segments(toolpath)
+    if not len(dx):
+        return MotionPlan(np.zeros(len(toolpath)), segment_time, entry_speed, cruise_speed, exit_speed, segment_acceleration)
+
+    length = np.hypot(dx, dy)
+    speed, acceleration = segment_dynamics(dx, dy, rate, limits)
+    junction = junction_speed_squared(dx, dy, speed, acceleration, limits)
+    # I limiti a finestra sono già compatibili all'indietro: resta la passata in avanti
+    vertex_speed = np.sqrt(plan_speeds(window_exit_limits(junction, length, acceleration, window), length, acceleration))
+    peak, seconds = trapezoid_profile(length, vertex_speed[:-1], vertex_speed[1:], speed, acceleration)
+
+    segment_time[segment] = seconds
+    entry_speed[segment] = vertex_speed[:-1]
+    cruise_speed[segment] = peak
+    exit_speed[segment] = vertex_speed[1:]
+    segment_acceleration[segment] = acceleration
+    block_time = np.bincount(block, weights=seconds, minlength=len(toolpath)) / 60.0
+    return MotionPlan(block_time, segment_time, entry_speed, cruise_speed, exit_speed, segment_acceleration)
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+from gcode_parser import PARSER_VERSION, GCodeProgram, load_program
+from program_file import MappedProgramFile
+from toolpath import TOOLPATH_VERSION, Toolpath, compute_toolpath
+
+# Cartella della cache, creata accanto ai programmi
+CACHE_DIR_NAME = '.cache'
+
+# La chiave cambia quando cambia il parser o il calcolo del percorso utensile
+CACHE_VERSION = f"{PARSER_VERSION}.{TOOLPATH_VERSION}"
+
+_READ_SIZE = 1024 * 1024
+
+
+def _default_file_mode():
+    """Permessi di un file nuovo secondo la umask del processo (mkstemp crea i file con 0600)."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# Letta una volta all'importazione, prima che i thread di lavoro possano creare file
+_FILE_MODE = _default_file_mode()
+
+
+def program_digest(program_path):
+    """SHA-1 del contenuto del programma combinato con la versione della cache."""
+    digest = hashlib.sha1(f"cnc-tornio/{CACHE_VERSION}\n".encode())
+    with open(program_path, 'rb') as file:
+        for data in iter(lambda: file.read(_READ_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def cache_path(program_path, digest=None):
+    """Percorso del file .npz in cache per il programma indicato."""
+    if digest is None:
+        digest = program_digest(program_path)
+    return os.path.join(os.path.dirname(program_path), CACHE_DIR_NAME, f"{digest}.npz")
+
+
+def load_cached_program(program_path):
+    """Restituisce (programma, percorso utensile), compilando il file solo se non è già in cache."""
+    path = cache_path(program_path)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            blocks = data['blocks']
+            toolpath = Toolpath(data['x'], data['y'], data['length'], data['duration'], data['feed'], data['motion'],
+                                data['path_x'], data['path_y'], data['path_block'], tuple(data['start']))
+        return GCodeProgram(blocks, MappedProgramFile(program_path)), toolpath
+    except (OSError, KeyError, ValueError):
+        pass
+
+    program = load_program(program_path)
+    toolpath = compute_toolpath(program)
+    try:
+        _write_cache(path, program, toolpath)
+    except OSError:
+        pass  # La cache è solo un'ottimizzazione: una cartella non scrivibile non è un errore
+    return program, toolpath
+
+
+def _write_cache(path, program, toolpath):
+    """Scrive la voce di cache in modo atomico."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(
+                file,
+                blocks=program.blocks,
+                x=toolpath.x,
+                y=toolpath.y,
+                length=toolpath.length,
+                duration=toolpath.duration,
+                feed=toolpath.feed,
+                motion=toolpath.motion,
+                path_x=toolpath.path_x,
+                path_y=toolpath.path_y,
+                path_block=toolpath.path_block,
+                start=np.array(toolpath.start),
+            )
+        # Leggibile dagli altri utenti di una cartella di programmi condivisa
+        os.chmod(temp_path, _FILE_MODE)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def invalidate_program_cache(program_path):
+    """Elimina la voce di cache del contenuto attuale del programma (da chiamare prima di riscriverlo)."""
+    if not os.path.isfile(program_path):
+        return
+    try:
+        os.remove(cache_path(program_path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,66 @@
+import mmap
+import os
+from array import array
+import numpy as np
+
+
+class MappedProgramFile:
+    """File .gcode mappato in memoria con un indice compatto degli offset di inizio linea.
+
+    Si comporta come una sequenza di stringhe: program_file[n] decodifica solo la linea n,
+    in tempo costante, senza tenere in memoria tutte le linee come oggetti str.
+    """
+
+    def __init__(self, program_path, encoding='utf-8'):
+        self.path = program_path
+        self.encoding = encoding
+        self._file = open(program_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap non accetta file vuoti: in quel caso l'indice resta vuoto
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.offsets = _build_line_index(self._map, size)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Indice di linea fuori dal programma")
+        raw = self._map[self.offsets[index]:self.offsets[index + 1]]
+        return raw.rstrip(b'\r\n').decode(self.encoding, errors='replace')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        """Rilascia la mappatura e chiude il file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _build_line_index(mapped, size):
+    """Costruisce l'array('Q') degli offset di inizio linea, più l'offset finale del file."""
+    offsets = array('Q', [0])
+    if not size:
+        return offsets
+
+    buffer = np.frombuffer(mapped, dtype=np.uint8)
+    starts = np.flatnonzero(buffer == ord('\n')).astype(np.uint64) + 1
+    del buffer  # La vista deve essere rilasciata prima di poter chiudere la mappatura
+
+    offsets.frombytes(starts.tobytes())
+    if offsets[-1] != size:
+        # Ultima linea senza a capo finale
+        offsets.append(size)
+    return offsets
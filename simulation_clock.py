@@ -0,0 +1,144 @@
+import numpy as np
+
+# Fotogrammi al secondo dell'animazione
+SIMULATION_FPS = 30
+
+# Moltiplicatore di velocità predefinito: un minuto di lavorazione dura un secondo
+DEFAULT_SPEED = 60.0
+
+
+class SimulationClock:
+    """Orologio della simulazione: a ogni fotogramma avanza il tempo simulato di speed / fps secondi.
+
+    Il numero di fotogrammi dipende solo dal tempo simulato e non dalla lunghezza o dall'avanzamento
+    dei movimenti; la posizione dell'utensile si interpola lungo la spezzata già calcolata.
+    plan: MotionPlan del planner, con cui l'utensile accelera e rallenta lungo ogni segmento come
+    sulla macchina; senza plan ogni blocco procede all'avanzamento programmato costante.
+    """
+
+    def __init__(self, toolpath, plan=None, fps=SIMULATION_FPS, speed=DEFAULT_SPEED):
+        self.toolpath = toolpath
+        self.plan = plan
+        self.fps = fps
+        self.speed = speed
+        if plan is None:
+            block_time = toolpath.duration
+            self.vertex_time = _vertex_times(toolpath, block_time)
+        else:
+            block_time = plan.block_time
+            self.vertex_time = np.concatenate(([0.0], np.cumsum(plan.segment_time)))
+        self.block_end_time = np.cumsum(block_time) * 60.0  # Secondi simulati a fine blocco
+        # Il tempo totale copre anche l'ultimo vertice, che le somme per blocco possono arrotondare
+        self.total_time = max(float(self.block_end_time[-1]) if len(block_time) else 0.0, float(self.vertex_time[-1]))
+        self.reset()
+
+    def reset(self):
+        """Riporta l'orologio all'inizio del programma."""
+        self.time = 0.0
+        self._vertex = 1
+        self._last_point = self.toolpath.start
+
+    def seek(self, time, vertex):
+        """Porta l'orologio al tempo time (s), con i vertici fino a vertex escluso già percorsi."""
+        self.time = time
+        self._vertex = vertex
+        self._last_point = (float(self.toolpath.path_x[vertex - 1]), float(self.toolpath.path_y[vertex - 1]))
+
+    @property
+    def reached_vertices(self):
+        """Numero di vertici della spezzata già raggiunti dall'utensile."""
+        return self._vertex
+
+    @property
+    def frame_interval(self):
+        """Intervallo tra due fotogrammi (ms) per root.after."""
+        return max(1, round(1000 / self.fps))
+
+    def tick(self, limit=None):
+        """Avanza di un fotogramma senza superare limit (s); restituisce la spezzata percorsa.
+
+        Il risultato è una lista di (xs, ys, motion), uno per tratto con lo stesso tipo di movimento,
+        che parte dall'ultimo punto restituito e arriva alla posizione attuale dell'utensile.
+        """
+        limit = self.total_time if limit is None else min(limit, self.total_time)
+        self.time = max(self.time, min(self.time + self.speed / self.fps, limit))
+        return self.advance_to(self.time)
+
+    def advance_to(self, time):
+        """Porta l'orologio al tempo indicato (s) e restituisce la spezzata percorsa dall'ultima chiamata."""
+        self.time = time
+        toolpath = self.toolpath
+        reached = int(np.searchsorted(self.vertex_time, time, side='right'))
+        xs = np.concatenate(([self._last_point[0]], toolpath.path_x[self._vertex:reached]))
+        ys = np.concatenate(([self._last_point[1]], toolpath.path_y[self._vertex:reached]))
+        blocks = toolpath.path_block[self._vertex:reached]
+        if reached < len(self.vertex_time):
+            # Punto intermedio del segmento in corso
+            x, y = self.position(time)
+            xs = np.append(xs, x)
+            ys = np.append(ys, y)
+            blocks = np.append(blocks, toolpath.path_block[reached])
+        self._vertex = reached
+        self._last_point = (float(xs[-1]), float(ys[-1]))
+        return _split_by_motion(xs, ys, toolpath.motion[blocks])
+
+    def position(self, time=None):
+        """Posizione (x, y) dell'utensile al tempo indicato (s), interpolata lungo il segmento in corso.
+
+        Con un plan la frazione di segmento percorsa segue il profilo di velocità pianificato.
+        """
+        time = self.time if time is None else time
+        path_x, path_y = self.toolpath.path_x, self.toolpath.path_y
+        vertex = int(np.searchsorted(self.vertex_time, time, side='right'))
+        if vertex >= len(self.vertex_time):
+            return float(path_x[-1]), float(path_y[-1])
+        t0, t1 = self.vertex_time[vertex - 1], self.vertex_time[vertex]
+        if t1 <= t0:
+            fraction = 1.0
+        elif self.plan is None:
+            fraction = (time - t0) / (t1 - t0)
+        else:
+            length = np.hypot(path_x[vertex] - path_x[vertex - 1], path_y[vertex] - path_y[vertex - 1])
+            fraction = min(self.plan.travelled(vertex - 1, time - t0) / length, 1.0) if length > 0 else 1.0
+        return (float(path_x[vertex - 1] + (path_x[vertex] - path_x[vertex - 1]) * fraction),
+                float(path_y[vertex - 1] + (path_y[vertex] - path_y[vertex - 1]) * fraction))
+
+    def current_block(self):
+        """Indice del blocco in esecuzione al tempo attuale."""
+        return min(int(np.searchsorted(self.block_end_time, self.time, side='left')), len(self.block_end_time) - 1)
+
+    @property
+    def finished(self):
+        return self.time >= self.total_time and self._vertex >= len(self.vertex_time)
+
+
+def _vertex_times(toolpath, block_time):
+    """Tempo simulato (s) in cui l'utensile raggiunge ogni vertice della spezzata.
+
+    La durata di ogni blocco si ripartisce tra i suoi segmenti in proporzione alla lunghezza;
+    l'ultimo vertice di ogni blocco cade esattamente alla fine del blocco.
+    """
+    block_end_time = np.cumsum(block_time) * 60.0
+    block = toolpath.path_block[1:]
+    if not len(block):
+        return np.zeros(1)
+    segment_length = np.hypot(np.diff(toolpath.path_x), np.diff(toolpath.path_y))
+    travelled = np.cumsum(segment_length)
+    first = np.searchsorted(block, block, side='left')
+    in_block = travelled - (travelled[first] - segment_length[first])
+    block_length = np.bincount(block, weights=segment_length, minlength=len(toolpath))[block]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        remaining = np.where(block_length > 0, 1.0 - in_block / block_length, 0.0)
+    remaining[np.append(block[1:] != block[:-1], True)] = 0.0
+    time = block_end_time[block] - np.asarray(block_time)[block] * 60.0 * remaining
+    return np.maximum.accumulate(np.concatenate(([0.0], time)))
+
+
+def _split_by_motion(xs, ys, motion):
+    """Divide la spezzata (n punti, n - 1 segmenti) in tratti con lo stesso tipo di movimento."""
+    if not len(motion):
+        return []
+    breaks = np.flatnonzero(np.diff(motion)) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(motion)]))
+    return [(xs[start:end + 1], ys[start:end + 1], int(motion[start])) for start, end in zip(starts, ends)]
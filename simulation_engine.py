@@ -0,0 +1,220 @@
+from bisect import bisect_right
+import numpy as np
+from gcode_parser import FLAG_INCHES, FLAG_VALID, KIND_G, invalid_line_message
+from motion_planner import plan_motion
+from program_cache import load_cached_program
+from simulation_clock import DEFAULT_SPEED, SIMULATION_FPS, SimulationClock
+from stock_model import stock_for_toolpath
+from toolpath import MOTION_FEED, compute_toolpath
+
+# Numero massimo di avvisi raccolti per programma
+MAX_WARNINGS = 100
+
+# Istruzioni tra due fotogrammi chiave
+KEYFRAME_INTERVAL = 1000
+
+# Memoria massima (byte) per le copie del pezzo nei fotogrammi chiave
+MAX_KEYFRAME_MEMORY = 64 * 1024 * 1024
+
+_MM_PER_INCH = 25.4
+
+
+class Keyframe:
+    """Stato della simulazione alla fine del blocco block.
+
+    vertex: lunghezza della parte di spezzata già percorsa (e disegnata); stock_radius: profilo del
+    pezzo (None senza lavorazioni). Posizione e stato modale si ricavano dal percorso e dalla
+    tabella dei blocchi, quindi non sono copiati.
+    """
+
+    def __init__(self, block, vertex, stock_radius):
+        self.block = block
+        self.vertex = vertex
+        self.stock_radius = stock_radius
+
+
+class SimulationEngine:
+    """Simulazione di un programma compilato, indipendente da Tk e da matplotlib.
+
+    Calcola posizioni, tempi, ingombro, avvisi e il pezzo lavorato; le viste (per esempio il grafico
+    del simulatore) si registrano con subscribe e ricevono a ogni avanzamento la spezzata appena
+    percorsa. Con build_keyframes, seek porta la simulazione a qualsiasi istruzione ripartendo dal
+    fotogramma chiave precedente.
+    """
+
+    def __init__(self, program, toolpath=None, limits=None, fps=SIMULATION_FPS, speed=DEFAULT_SPEED):
+        self.program = program
+        self.toolpath = compute_toolpath(program) if toolpath is None else toolpath
+        self.cycle_time = plan_motion(self.toolpath, limits=limits)
+        self.clock = SimulationClock(self.toolpath, self.cycle_time, fps, speed)
+        self.warnings = program_warnings(program, self.toolpath)
+        self.stock = stock_for_toolpath(self.toolpath)
+        self.keyframes = []
+        self._keyframe_blocks = []
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Registra callback(engine, parts), chiamata a ogni avanzamento con i tratti (xs, ys, motion)."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def reset(self):
+        """Riporta la simulazione all'inizio del programma."""
+        self.clock.reset()
+        if self.stock is not None:
+            self.stock.reset()
+
+    def step(self, limit=None):
+        """Avanza di un fotogramma senza superare il tempo simulato limit (s)."""
+        return self._publish(self.clock.tick(limit))
+
+    def run(self):
+        """Esegue il resto del programma in un solo passo, alla massima velocità e senza animazione."""
+        return self._publish(self.clock.advance_to(self.clock.total_time))
+
+    def build_keyframes(self, interval=KEYFRAME_INTERVAL):
+        """Precalcola un fotogramma chiave ogni interval istruzioni.
+
+        L'intervallo si allarga solo se le copie del pezzo supererebbero MAX_KEYFRAME_MEMORY.
+        """
+        count = len(self.toolpath)
+        stock = stock_for_toolpath(self.toolpath)
+        if stock is not None:
+            snapshots = max(MAX_KEYFRAME_MEMORY // stock.radius.nbytes, 1)
+            interval = max(interval, -(-count // snapshots))
+        keyframes = []
+        vertex = 1
+        for block in range(interval - 1, count, interval):
+            next_vertex = self._vertices_through(block)
+            if stock is not None:
+                self._cut_vertices(stock, vertex, next_vertex)
+            vertex = next_vertex
+            keyframes.append(Keyframe(block, vertex, None if stock is None else stock.radius.copy()))
+        self.keyframes = keyframes
+        self._keyframe_blocks = [keyframe.block for keyframe in keyframes]
+
+    def seek(self, index):
+        """Porta la simulazione alla fine dell'istruzione index.
+
+        Si riparte dal fotogramma chiave precedente e si ripete solo il tratto che manca, quindi il
+        costo non dipende dalla posizione dell'istruzione nel programma.
+        """
+        if not len(self.toolpath):
+            return
+        index = max(0, min(index, len(self.toolpath) - 1))
+        vertex = self._vertices_through(index)
+        position = bisect_right(self._keyframe_blocks, index)
+        keyframe = self.keyframes[position - 1] if position else None
+        if self.stock is not None:
+            if keyframe is None:
+                self.stock.reset()
+            else:
+                self.stock.radius[:] = keyframe.stock_radius
+            self._cut_vertices(self.stock, 1 if keyframe is None else keyframe.vertex, vertex)
+        self.clock.seek(float(self.clock.block_end_time[index]), vertex)
+
+    def travelled_path(self):
+        """Spezzata già percorsa (xs, ys) e tipo di movimento di ogni suo segmento."""
+        vertex = self.clock.reached_vertices
+        toolpath = self.toolpath
+        return (toolpath.path_x[:vertex], toolpath.path_y[:vertex],
+                toolpath.motion[toolpath.path_block[1:vertex]])
+
+    def _vertices_through(self, block):
+        """Numero di vertici della spezzata generati fino al blocco block compreso."""
+        return int(np.searchsorted(self.toolpath.path_block, block, side='right'))
+
+    def _cut_vertices(self, stock, first, last):
+        """Asporta dal pezzo i segmenti di lavoro che terminano nei vertici first..last-1."""
+        toolpath = self.toolpath
+        end = np.arange(first, last)
+        end = end[toolpath.motion[toolpath.path_block[end]] == MOTION_FEED]
+        stock.cut_segments(toolpath.path_x[end - 1], toolpath.path_y[end - 1], toolpath.path_x[end], toolpath.path_y[end])
+
+    def _publish(self, parts):
+        if self.stock is not None:
+            for xs, ys, motion in parts:
+                if motion == MOTION_FEED:
+                    self.stock.cut(xs, ys)
+        for callback in self._subscribers:
+            callback(self, parts)
+        return parts
+
+    @property
+    def finished(self):
+        return self.clock.finished
+
+    @property
+    def current_block(self):
+        return self.clock.current_block()
+
+    @property
+    def position(self):
+        return self.clock.position()
+
+    @property
+    def total_time(self):
+        """Tempo ciclo stimato (min)."""
+        return self.cycle_time.total_time
+
+    def summary(self):
+        """Risultati della simulazione come dizionario (per report e confronti tra esecuzioni)."""
+        return {
+            'lines': len(self.program),
+            'total_length': self.toolpath.total_length,
+            'cycle_time': self.total_time,
+            'bounding_box': self.toolpath.bounding_box,
+            'warnings': self.warnings,
+        }
+
+
+def load_engine(program_path, on_progress=None):
+    """Legge (dalla cache se possibile) un file .gcode e ne prepara la simulazione con i fotogrammi chiave.
+
+    on_progress(messaggio) viene chiamata prima di ogni fase; la funzione non usa Tk e può
+    essere eseguita in un thread di lavoro.
+    """
+    report = on_progress or (lambda message: None)
+    report("Lettura e compilazione del programma...")
+    program, toolpath = load_cached_program(program_path)
+    try:
+        report("Calcolo dei tempi ciclo e degli avvisi...")
+        engine = SimulationEngine(program, toolpath)
+        report("Calcolo dei fotogrammi chiave...")
+        engine.build_keyframes()
+    except Exception:
+        program.close()
+        raise
+    return engine
+
+
+def program_warnings(program, toolpath, limit=MAX_WARNINGS):
+    """Avvisi sul programma in ordine di linea: istruzioni non valide, lavorazioni senza avanzamento
+    e archi con raggio più corto di metà corda (al massimo limit avvisi)."""
+    blocks = program.blocks
+    invalid = (blocks['flags'] & FLAG_VALID) == 0
+    no_feed = (toolpath.motion == MOTION_FEED) & ~(toolpath.feed > 0)
+
+    # Archi in formato R: il raggio deve essere almeno metà della corda
+    scale = np.where((blocks['flags'] & FLAG_INCHES) != 0, _MM_PER_INCH, 1.0)
+    x0 = np.concatenate(([toolpath.start[0]], toolpath.x[:-1]))
+    y0 = np.concatenate(([toolpath.start[1]], toolpath.y[:-1]))
+    chord = np.hypot(toolpath.x - x0, toolpath.y - y0)
+    radius_arc = ((blocks['kind'] == KIND_G) & ((blocks['code'] == 2) | (blocks['code'] == 3))
+                  & np.isnan(blocks['i']) & np.isnan(blocks['j']) & ~np.isnan(blocks['r']))
+    with np.errstate(invalid='ignore'):
+        short_radius = radius_arc & (2.0 * np.abs(blocks['r'] * scale) < chord - 1e-6)
+
+    warnings = []
+    for index in np.flatnonzero(invalid | no_feed | short_radius)[:limit]:
+        line_number = program.first_line + int(index) + 1
+        line = program.line(index)
+        if invalid[index]:
+            warnings.append(invalid_line_message(line, line_number))
+        elif no_feed[index]:
+            warnings.append(f"Movimento di lavoro senza avanzamento F alla linea {line_number}: '{line.strip()}'")
+        else:
+            warnings.append(f"Raggio troppo piccolo per l'arco alla linea {line_number}: '{line.strip()}'")
+    return warnings
@@ -1,7 +1,24 @@
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
-import math
+from instruction_view import InstructionView
+from level_of_detail import pixel_size
+from simulation_clock import DEFAULT_SPEED
+from simulation_engine import load_engine
+from spatial_index import SpatialIndex
+from toolpath import MOTION_NONE, START_POSITION
+from toolpath_renderer import ToolpathRenderer
+
+# Attesa (ms) dopo l'ultimo movimento del cursore prima di saltare all'istruzione scelta
+SEEK_DELAY = 100
+
+# Distanza massima (pixel) tra il clic sul grafico e il percorso per selezionare un'istruzione
+CLICK_TOLERANCE = 5
+
+# Intervallo (ms) con cui Tk controlla i risultati del thread di preparazione
+PREPARATION_POLL_INTERVAL = 50
 
 def prepare_simulation(app):
     """Prepara la simulazione delle istruzioni G-code."""
@@ -16,17 +33,68 @@ def prepare_simulation(app):
         return
 
     app.clear_left_frame()
+    close_program(app)
+    app.seek_job = None
 
-    # Mostra le istruzioni G-code
-    with open(program_path, 'r') as file:
-        gcode_instructions = file.readlines()
-
-    app.gcode_listbox = tk.Listbox(app.left_frame)
-    app.gcode_listbox.pack(padx=10, pady=10, fill="both", expand=True)
-    for instruction in gcode_instructions:
-        app.gcode_listbox.insert(tk.END, instruction.strip())
+    # Lettura, compilazione e precalcoli avvengono in un thread; Tk svuota soltanto la coda dei risultati
+    app.preparation_results = queue.Queue()
+    threading.Thread(target=run_preparation, args=(program_path, app.preparation_results), daemon=True).start()
+    app.back_button = ttk.Button(app.left_frame, text="Indietro", command=lambda: cancel_simulation(app))
+    app.back_button.pack(pady=10)
+    app.show_message("Preparazione della simulazione...")
+    poll_preparation(app, app.preparation_results)
+
+def run_preparation(program_path, results):
+    """Nel thread di lavoro: prepara motore di simulazione e indice spaziale e li mette nella coda."""
+    try:
+        engine = load_engine(program_path, on_progress=lambda message: results.put(('progress', message)))
+        spatial_index = SpatialIndex(engine.toolpath.path_x, engine.toolpath.path_y)
+        results.put(('ready', (engine, spatial_index)))
+    except Exception as e:
+        results.put(('error', str(e)))
+
+def poll_preparation(app, results):
+    """Nel thread di Tk: mostra l'avanzamento della preparazione e, quando è pronta, la simulazione."""
+    while True:
+        try:
+            kind, payload = results.get_nowait()
+        except queue.Empty:
+            break
+        if results is not app.preparation_results:
+            # Preparazione annullata: si attende la fine del thread solo per rilasciare il file mappato
+            if kind == 'ready':
+                payload[0].program.close()
+            if kind != 'progress':
+                return
+            continue
+        if kind == 'progress':
+            app.show_message(payload)
+        elif kind == 'ready':
+            app.preparation_results = None
+            show_simulation(app, *payload)
+            return
+        else:
+            app.preparation_results = None
+            app.show_message(f"Errore durante la preparazione della simulazione: {payload}", "error")
+            return
+    app.root.after(PREPARATION_POLL_INTERVAL, lambda: poll_preparation(app, results))
 
-    app.start_simulation_button = ttk.Button(app.left_frame, text="Avvia Simulazione", command=lambda: simulate_program(app, gcode_instructions))
+def show_simulation(app, engine, spatial_index):
+    """Mostra la lista delle istruzioni, i comandi e il grafico di una simulazione già preparata."""
+    app.clear_left_frame()
+    app.engine = engine
+    app.program, app.toolpath = engine.program, engine.toolpath
+    app.engine.subscribe(lambda engine, parts: draw_simulation_frame(app, parts))
+    app.stock = app.engine.stock
+    app.piece_shown = False
+    app.spatial_index = spatial_index
+    disconnect_graph_click(app)
+    app.click_connection = app.canvas.mpl_connect('button_press_event', lambda event: on_graph_click(app, event))
+
+    app.instruction_view = InstructionView(app.left_frame, app.program)
+    app.instruction_view.pack(padx=10, pady=10, fill="both", expand=True)
+
+    app.start_simulation_button = ttk.Button(app.left_frame, text="Avvia Simulazione", command=lambda: simulate_program(app, app.program))
     app.start_simulation_button.pack(pady=10)
 
     app.step_simulation_button = ttk.Button(app.left_frame, text="Esegui Istruzione", command=lambda: step_simulation(app))
@@ -38,10 +106,25 @@ def prepare_simulation(app):
     app.resume_simulation_button = ttk.Button(app.left_frame, text="Riprendi", command=lambda: resume_simulation(app))
     app.resume_simulation_button.pack(pady=10)
 
+    app.show_piece_button = ttk.Button(app.left_frame, text="Mostra Pezzo", command=lambda: show_piece(app))
+    app.show_piece_button.pack(pady=10)
+
+    ttk.Label(app.left_frame, text="Velocità simulazione (x)").pack()
+    app.simulation_speed = tk.DoubleVar(value=DEFAULT_SPEED)
+    app.simulation_speed_spinbox = ttk.Spinbox(app.left_frame, from_=1, to=10000, increment=10, textvariable=app.simulation_speed, width=8)
+    app.simulation_speed_spinbox.pack(pady=5)
+
+    ttk.Label(app.left_frame, text="Vai all'istruzione").pack()
+    app.seek_scale = ttk.Scale(app.left_frame, from_=0, to=max(len(app.program) - 1, 0), orient="horizontal",
+                               command=lambda value: schedule_seek(app, int(float(value))))
+    app.seek_scale.pack(padx=10, pady=5, fill="x")
+
     app.back_button = ttk.Button(app.left_frame, text="Indietro", command=lambda: cancel_simulation(app))
     app.back_button.pack(pady=10)
 
-    app.show_message("Premi 'Avvia Simulazione' per iniziare o 'Esegui Istruzione' per eseguire un'istruzione alla volta.")
+    app.show_message(f"Premi 'Avvia Simulazione' per iniziare o 'Esegui Istruzione' per eseguire un'istruzione alla volta. "
+                     f"Percorso: {app.toolpath.total_length:.1f} mm, tempo ciclo stimato: {app.engine.total_time:.2f} min"
+                     + (f", avvisi: {len(app.engine.warnings)} (primo: {app.engine.warnings[0]})" if app.engine.warnings else ""))
 
     # Inizializza l'indice dell'istruzione corrente e la posizione
     reset_simulation(app)
@@ -52,114 +135,108 @@ def prepare_simulation(app):
 
 def reset_simulation(app):
     """Resetta la simulazione alle impostazioni iniziali."""
+    cancel_simulation_job(app)
+    deselect_all_instructions(app)
     app.current_instruction_index = 0
-    app.current_position = [30, -10]  # Posizione iniziale
+    app.current_position = list(START_POSITION)  # Posizione iniziale
     app.simulation_paused = False
     app.simulation_stopped = False
+    app.engine.reset()
     initialize_graph(app)
-    deselect_all_instructions(app)
+    if app.piece_shown:
+        app.renderer.show_piece(app.stock.outline())
 
 def initialize_graph(app):
     """Inizializza il grafico."""
+    if getattr(app, 'renderer', None) is not None:
+        app.renderer.remove()
     app.ax.clear()
     app.ax.set_xlabel("X")
     app.ax.set_ylabel("Y")
     app.ax.set_xlim([0, 35])
     app.ax.set_ylim([-20, 20])
-    triangle = [[30, -10], [30-1, -10-1], [30+1, -10-1]]
-    app.ax.add_patch(plt.Polygon(triangle, closed=True, color='green'))
+    app.renderer = ToolpathRenderer(app.ax, app.canvas, START_POSITION)
     app.canvas.draw()
 
 def deselect_all_instructions(app):
-    """Deseleziona tutte le istruzioni nella listbox."""
-    for i in range(app.gcode_listbox.size()):
-        app.gcode_listbox.itemconfig(i, {'bg':'white'})
+    """Deseleziona l'istruzione evidenziata nella lista."""
+    app.instruction_view.clear_highlight()
 
-def simulate_program(app, gcode_instructions):
+def simulate_program(app, program):
     """Simula tutte le istruzioni G-code sul grafico."""
     reset_simulation(app)
-    app.gcode_instructions = gcode_instructions
-    execute_next_instruction(app)
-
-def execute_next_instruction(app):
-    """Esegue la prossima istruzione G-code."""
+    app.program = program
+    schedule_simulation_tick(app, 0)
+
+def schedule_simulation_tick(app, delay):
+    """Pianifica il prossimo passo dell'esecutore nel ciclo degli eventi di Tk."""
+    app.simulation_job = app.root.after(delay, lambda: simulation_tick(app))
+
+def cancel_simulation_job(app):
+    """Annulla il passo o il fotogramma già pianificato, se presente."""
+    job = getattr(app, 'simulation_job', None)
+    if job is not None:
+        app.root.after_cancel(job)
+        app.simulation_job = None
+
+def simulation_tick(app):
+    """Un passo dell'esecutore: avanza di un fotogramma e aggiorna l'istruzione corrente.
+
+    Ogni passo ha un costo limitato (un fotogramma dell'orologio e una ricerca binaria del blocco
+    raggiunto) e poi restituisce il controllo a Tk, quindi lo stack resta piatto anche con milioni
+    di istruzioni; pausa e interruzione vengono controllate tra un passo e l'altro.
+    """
+    app.simulation_job = None
     if app.simulation_paused or app.simulation_stopped:
         return
 
-    if app.current_instruction_index >= len(app.gcode_instructions):
+    started = time.perf_counter()
+    engine = app.engine
+    engine.clock.speed = simulation_speed(app)
+    engine.step()
+
+    if engine.finished:
+        app.current_instruction_index = len(app.program)
+        app.current_position = list(engine.position)
+        highlight_instruction(app, len(app.program) - 1)
         app.show_message("Simulazione completata")
         return
 
-    # Deseleziona l'istruzione precedente
-    if app.current_instruction_index > 0 and app.current_instruction_index - 1 < app.gcode_listbox.size():
-        app.gcode_listbox.itemconfig(app.current_instruction_index - 1, {'bg':'white'})
+    index = engine.current_block
+    app.current_instruction_index = index
+    app.current_position = list(engine.position)
+    if highlight_instruction(app, index):
+        app.show_message(f"Eseguendo: {app.program.line(index)} (tempo rimanente: {engine.cycle_time.remaining_time(index):.2f} min)")
 
-    if app.simulation_stopped:
-        return
+    # Mantiene la frequenza dei fotogrammi lasciando sempre un intervallo libero agli eventi di Tk
+    elapsed = int((time.perf_counter() - started) * 1000)
+    schedule_simulation_tick(app, max(1, engine.clock.frame_interval - elapsed))
 
-    instruction = app.gcode_instructions[app.current_instruction_index].strip()
-    app.gcode_listbox.itemconfig(app.current_instruction_index, {'bg':'yellow'})  # Evidenzia l'istruzione corrente
-    app.canvas.draw()
-    app.root.update()
-
-    x, y = app.current_position
-    x, y, duration, feed_rate = execute_gcode_instruction(app, instruction, x, y)
-
-    if instruction.startswith('G00') or instruction.startswith('G01'):
-        if instruction.startswith('G00'):
-            draw_line(app, app.current_position, [x, y], 'ro-')
-            app.current_position = [x, y]
-            app.canvas.draw()
-            app.show_message(f"Eseguendo: {instruction}")
-            app.current_instruction_index += 1
-            execute_next_instruction(app)
-        else:
-            draw_line_with_speed(app, app.current_position, [x, y], 'bo-', feed_rate, lambda: on_line_draw_complete(app, [x, y]))
-    else:
-        app.current_instruction_index += 1
-        execute_next_instruction(app)
-
-def on_line_draw_complete(app, new_position):
-    """Callback per quando il disegno della linea è completo."""
-    app.current_position = new_position
-    app.current_instruction_index += 1
-    execute_next_instruction(app)
+def highlight_instruction(app, index):
+    """Evidenzia l'istruzione index nella lista; restituisce False se era già evidenziata."""
+    return app.instruction_view.highlight(index)
 
 def step_simulation(app):
     """Esegue un'istruzione G-code alla volta sul grafico."""
-    if app.current_instruction_index >= app.gcode_listbox.size():
+    if app.current_instruction_index >= len(app.program):
         app.show_message("Tutte le istruzioni sono state eseguite")
         reset_simulation(app)
         return
 
-    # Deseleziona l'istruzione precedente
-    if app.current_instruction_index > 0 and app.current_instruction_index - 1 < app.gcode_listbox.size():
-        app.gcode_listbox.itemconfig(app.current_instruction_index - 1, {'bg':'white'})
+    cancel_simulation_job(app)
+    index = app.current_instruction_index
+    highlight_instruction(app, index)
 
-    instruction = app.gcode_listbox.get(app.current_instruction_index).strip()
-    app.gcode_listbox.itemconfig(app.current_instruction_index, {'bg':'yellow'})  # Evidenzia l'istruzione corrente
-    app.canvas.draw()
-    app.root.update()
-
-    x, y = app.current_position
-    x, y, duration, feed_rate = execute_gcode_instruction(app, instruction, x, y)
-
-    if instruction.startswith('G00') or instruction.startswith('G01'):
-        if instruction.startswith('G00'):
-            draw_line(app, app.current_position, [x, y], 'ro-')
-            app.current_position = [x, y]
-            app.canvas.draw()
-            app.show_message(f"Eseguendo: {instruction}")
-            app.current_instruction_index += 1
-        else:
-            draw_line_with_speed(app, app.current_position, [x, y], 'bo-', feed_rate, lambda: on_step_complete(app, [x, y]))
-    else:
-        app.current_instruction_index += 1
+    # Posizioni e tempi sono già calcolati per tutto il programma
+    x, y = float(app.toolpath.x[index]), float(app.toolpath.y[index])
+    app.current_instruction_index += 1
+    if app.toolpath.motion[index] != MOTION_NONE:
+        animate_until(app, app.engine.clock.block_end_time[index], lambda: on_step_complete(app, [x, y]))
 
 def on_step_complete(app, new_position):
     """Callback per quando il disegno della linea è completo in modalità step."""
     app.current_position = new_position
-    app.show_message(f"Istruzione completata: {app.gcode_listbox.get(app.current_instruction_index - 1)}")
+    app.show_message(f"Istruzione completata: {app.program.line(app.current_instruction_index - 1)}")
 
 def pause_simulation(app):
     """Mette in pausa la simulazione."""
@@ -171,58 +248,121 @@ def resume_simulation(app):
     if app.simulation_paused:
         app.simulation_paused = False
         app.show_message("Simulazione ripresa")
-        execute_next_instruction(app)
+        cancel_simulation_job(app)
+        schedule_simulation_tick(app, 0)
 
 def cancel_simulation(app):
     """Interrompe la simulazione e torna alla schermata principale."""
     app.simulation_stopped = True
-    app.clear_left_frame()
-    app.show_main_buttons()
-
-def execute_gcode_instruction(app, instruction, current_x, current_y):
-    """Esegue una singola istruzione G-code e aggiorna la posizione."""
-    x, y = current_x, current_y
-    feed_rate = None
-    duration = 0  # Inizializza la variabile duration
-    if instruction.startswith('G1') or instruction.startswith('G0') or instruction.startswith('G00') or instruction.startswith('G01'):
-        parts = instruction.split()
-        for part in parts:
-            if part.startswith('X'):
-                x = float(part[1:])  # Aggiorna la coordinata X
-            elif part.startswith('Y'):
-                y = float(part[1:])  # Aggiorna la coordinata Y
-            elif part.startswith('F'):
-                feed_rate = float(part[1:])
-                
-        # Calcola la durata basata sulla velocità di avanzamento (feed rate)
-        if feed_rate:
-            distance = math.sqrt((x - current_x)**2 + (y - current_y)**2)
-            duration = distance / feed_rate
-    return x, y, duration, feed_rate
-
-def draw_line_with_speed(app, start, end, style, feed_rate, callback):
-    """Disegna una linea sul grafico in modo incrementale rispettando la velocità di avanzamento."""
-    x0, y0 = start
-    x1, y1 = end
-    distance = math.sqrt((x1 - x0)**2 + (y1 - y0)**2)
-    steps = int(distance * 10)  # Aumenta il numero di passi per migliorare la precisione
-    dx = (x1 - x0) / steps
-    dy = (y1 - y0) / steps
-    delay = int((distance / feed_rate) / steps * 1000)  # Calcola il ritardo per ogni passo
-
-    def draw_step(step):
+    app.preparation_results = None
+    cancel_simulation_job(app)
+    if app.seek_job is not None:
+        app.root.after_cancel(app.seek_job)
+        app.seek_job = None
+    disconnect_graph_click(app)
+    close_program(app)
+    app.initialize_left_frame()
+    app.load_existing_programs()
+
+def close_program(app):
+    """Rilascia il file mappato del programma in simulazione."""
+    program = getattr(app, 'program', None)
+    if program is not None:
+        program.close()
+        app.program = None
+
+def schedule_seek(app, index):
+    """Salta all'istruzione scelta con il cursore quando l'utente smette di trascinarlo."""
+    if app.seek_job is not None:
+        app.root.after_cancel(app.seek_job)
+    app.seek_job = app.root.after(SEEK_DELAY, lambda: seek_simulation(app, index))
+
+def seek_simulation(app, index):
+    """Mostra lo stato della simulazione alla fine dell'istruzione index e mette in pausa."""
+    app.seek_job = None
+    cancel_simulation_job(app)
+    app.simulation_paused = True
+    app.simulation_stopped = False
+    app.engine.seek(index)
+    app.current_instruction_index = index + 1
+    app.current_position = list(app.engine.position)
+
+    app.renderer.set_path(*app.engine.travelled_path())
+    if app.piece_shown:
+        app.renderer.show_piece(app.stock.outline())
+    app.renderer.move_tool(*app.engine.position)
+    app.renderer.update()
+    highlight_instruction(app, index)
+    app.show_message(f"Istruzione {index + 1}: {app.program.line(index)} "
+                     f"(tempo rimanente: {app.engine.cycle_time.remaining_time(index):.2f} min). Premi 'Riprendi' per continuare")
+
+def on_graph_click(app, event):
+    """Seleziona nella lista l'istruzione che ha generato il tratto di percorso cliccato."""
+    if event.inaxes is not app.ax or event.xdata is None:
+        return
+    tolerance = CLICK_TOLERANCE * pixel_size(app.ax)
+    # Solo la parte di percorso già disegnata
+    segment = app.spatial_index.nearest(event.xdata, event.ydata, tolerance, limit=app.engine.clock.reached_vertices - 1)
+    if segment is None:
+        app.show_message("Nessuna istruzione vicino al punto selezionato")
+        return
+    index = int(app.toolpath.path_block[segment + 1])
+    highlight_instruction(app, index)
+    app.show_message(f"Linea {app.program.first_line + index + 1}: {app.program.line(index)}")
+
+def disconnect_graph_click(app):
+    """Scollega la selezione con il clic dal grafico, se attiva."""
+    connection = getattr(app, 'click_connection', None)
+    if connection is not None:
+        app.canvas.mpl_disconnect(connection)
+        app.click_connection = None
+
+def animate_until(app, end_time, callback):
+    """Anima l'utensile a frequenza fissa fino al tempo simulato end_time (s), poi chiama callback.
+
+    A ogni fotogramma l'orologio avanza di un passo che dipende solo dalla velocità di simulazione,
+    quindi il numero di callback non cresce con la lunghezza o l'avanzamento del movimento.
+    """
+    def draw_frame():
+        app.simulation_job = None
         if app.simulation_stopped:
             return
-        if step > steps:
+        app.engine.clock.speed = simulation_speed(app)
+        app.engine.step(end_time)
+        if app.engine.clock.time >= end_time:
             callback()
             return
-        app.ax.plot([x0 + dx * (step - 1), x0 + dx * step], [y0 + dy * (step - 1), y0 + dy * step], style)
-        app.canvas.draw()
-        app.root.after(delay, lambda: draw_step(step + 1))
-    
-    draw_step(1)
-
-def draw_line(app, start, end, style):
-    """Disegna una linea sul grafico."""
-    app.ax.plot([start[0], end[0]], [start[1], end[1]], style)
-    app.canvas.draw()
\ No newline at end of file
+        app.simulation_job = app.root.after(app.engine.clock.frame_interval, draw_frame)
+
+    draw_frame()
+
+def simulation_speed(app):
+    """Moltiplicatore di velocità scelto dall'utente (quello predefinito se non valido)."""
+    try:
+        speed = app.simulation_speed.get()
+    except tk.TclError:
+        return DEFAULT_SPEED
+    return speed if speed > 0 else DEFAULT_SPEED
+
+def draw_simulation_frame(app, parts):
+    """Disegna i tratti percorsi nell'ultimo fotogramma e vi sposta l'utensile."""
+    for xs, ys, motion in parts:
+        app.renderer.add_path(xs, ys, motion)
+    if app.piece_shown:
+        app.renderer.show_piece(app.stock.outline())
+    app.renderer.move_tool(*app.engine.position)
+    app.renderer.update()
+
+def show_piece(app):
+    """Mostra o nasconde il pezzo lavorato fino ad ora (profilo del materiale rimasto)."""
+    if app.stock is None:
+        app.show_message("Nessuna lavorazione da mostrare")
+        return
+    app.piece_shown = not app.piece_shown
+    if app.piece_shown:
+        app.renderer.show_piece(app.stock.outline())
+        app.show_piece_button.config(text="Nascondi Pezzo")
+    else:
+        app.renderer.hide_piece()
+        app.show_piece_button.config(text="Mostra Pezzo")
+    app.renderer.update()
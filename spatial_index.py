@@ -0,0 +1,123 @@
+import numpy as np
+
+# Numero medio di segmenti per cella della griglia
+SEGMENTS_PER_CELL = 4
+
+# Massimo numero di celle per lato della griglia
+MAX_GRID_SIZE = 1024
+
+# Segmenti più lunghi di questo numero di celle (rapidi, risalite al cambio utensile) restano fuori
+# dalla griglia e sono esaminati a parte a ogni ricerca
+LONG_SEGMENT_CELLS = 8
+
+
+class SpatialIndex:
+    """Griglia uniforme sui segmenti di una spezzata, per trovare il segmento più vicino a un punto.
+
+    Ogni segmento è registrato nelle celle coperte dai suoi tratti, lunghi al più una cella; le celle
+    sono memorizzate in forma compatta (offset per cella e indici dei segmenti ordinati per cella),
+    quindi una ricerca esamina solo i segmenti delle poche celle vicine al punto. I segmenti lunghi
+    sono tenuti in una lista a parte con i loro rettangoli di ingombro, così le voci della griglia
+    restano poche per segmento anche quando il percorso contiene molti spostamenti lunghi.
+    """
+
+    def __init__(self, xs, ys):
+        self.x0, self.y0 = xs[:-1], ys[:-1]
+        self.x1, self.y1 = xs[1:], ys[1:]
+        count = len(self.x0)
+        finite = np.isfinite(xs)
+        if count and finite.any():
+            self.x_min, self.x_max = float(xs[finite].min()), float(xs[finite].max())
+            self.y_min, self.y_max = float(ys[finite].min()), float(ys[finite].max())
+        else:
+            self.x_min = self.x_max = self.y_min = self.y_max = 0.0
+        width = max(self.x_max - self.x_min, 1e-9)
+        height = max(self.y_max - self.y_min, 1e-9)
+
+        # Celle quadrate con in media SEGMENTS_PER_CELL segmenti ciascuna
+        cells = max(count / SEGMENTS_PER_CELL, 1.0)
+        self.cell_size = max(np.sqrt(width * height / cells), max(width, height) / MAX_GRID_SIZE)
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+
+        # I segmenti con coordinate non finite (interruzioni della spezzata) non sono registrati
+        dx, dy = self.x1 - self.x0, self.y1 - self.y0
+        length = np.hypot(dx, dy)
+        finite = np.isfinite(length)
+        long_segment = finite & (length > LONG_SEGMENT_CELLS * self.cell_size)
+        self.long_segments = np.flatnonzero(long_segment)
+        self.long_x_min = np.minimum(self.x0, self.x1)[self.long_segments]
+        self.long_x_max = np.maximum(self.x0, self.x1)[self.long_segments]
+        self.long_y_min = np.minimum(self.y0, self.y1)[self.long_segments]
+        self.long_y_max = np.maximum(self.y0, self.y1)[self.long_segments]
+
+        # Gli altri sono divisi in tratti non più lunghi di una cella: ogni tratto copre al massimo
+        # 2x2 celle, quindi ogni segmento ha al più 4 * LONG_SEGMENT_CELLS voci
+        short = finite & ~long_segment
+        pieces = np.ones(count, dtype=np.int64)
+        pieces[short] = np.maximum(np.ceil(length[short] / self.cell_size), 1)
+        piece_segment = np.repeat(np.arange(count), pieces)
+        piece = np.arange(len(piece_segment)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        piece = piece[np.repeat(short, pieces)]
+        piece_segment = piece_segment[np.repeat(short, pieces)]
+        start = piece / pieces[piece_segment]
+        end = (piece + 1) / pieces[piece_segment]
+        piece_x0 = self.x0[piece_segment] + start * dx[piece_segment]
+        piece_y0 = self.y0[piece_segment] + start * dy[piece_segment]
+        piece_x1 = self.x0[piece_segment] + end * dx[piece_segment]
+        piece_y1 = self.y0[piece_segment] + end * dy[piece_segment]
+
+        column_low, row_low = self._cell(np.minimum(piece_x0, piece_x1), np.minimum(piece_y0, piece_y1))
+        column_high, row_high = self._cell(np.maximum(piece_x0, piece_x1), np.maximum(piece_y0, piece_y1))
+        span_columns = column_high - column_low + 1
+        span_rows = row_high - row_low + 1
+        per_piece = span_columns * span_rows
+
+        # Una voce (cella, segmento) per ogni cella coperta da ogni tratto, senza ripetizioni
+        entry = np.repeat(np.arange(len(piece_segment)), per_piece)
+        offset = np.arange(len(entry)) - np.repeat(np.cumsum(per_piece) - per_piece, per_piece)
+        column = column_low[entry] + offset % span_columns[entry]
+        row = row_low[entry] + offset // span_columns[entry]
+        keys = np.unique((row * self.columns + column) * max(count, 1) + piece_segment[entry])
+        self.segments = keys % max(count, 1)
+        self.cell_start = np.searchsorted(keys // max(count, 1), np.arange(self.rows * self.columns + 1))
+
+    def _cell(self, x, y):
+        column = np.clip(((x - self.x_min) / self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip(((y - self.y_min) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return column, row
+
+    def nearest(self, x, y, tolerance, limit=None):
+        """Indice del segmento più vicino a (x, y) entro tolerance, o None.
+
+        Con limit si considerano solo i segmenti con indice minore (per esempio quelli già percorsi).
+        """
+        if (x < self.x_min - tolerance or x > self.x_max + tolerance
+                or y < self.y_min - tolerance or y > self.y_max + tolerance):
+            return None
+        (column_low, column_high), (row_low, row_high) = self._cell(
+            np.array([x - tolerance, x + tolerance]), np.array([y - tolerance, y + tolerance]))
+        candidates = [
+            self.segments[self.cell_start[row * self.columns + column_low]:self.cell_start[row * self.columns + column_high + 1]]
+            for row in range(row_low, row_high + 1)
+        ]
+        # Segmenti lunghi il cui rettangolo di ingombro (allargato della tolleranza) contiene il punto
+        near_long = ((self.long_x_min <= x + tolerance) & (self.long_x_max >= x - tolerance)
+                     & (self.long_y_min <= y + tolerance) & (self.long_y_max >= y - tolerance))
+        candidates.append(self.long_segments[near_long])
+        candidates = np.unique(np.concatenate(candidates))
+        if limit is not None:
+            candidates = candidates[candidates < limit]
+        if not len(candidates):
+            return None
+
+        # Distanza punto-segmento
+        x0, y0 = self.x0[candidates], self.y0[candidates]
+        dx, dy = self.x1[candidates] - x0, self.y1[candidates] - y0
+        length_squared = dx * dx + dy * dy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(length_squared > 0, ((x - x0) * dx + (y - y0) * dy) / length_squared, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        distance = np.hypot(x0 + t * dx - x, y0 + t * dy - y)
+        best = int(np.argmin(distance))
+        return int(candidates[best]) if distance[best] <= tolerance else None
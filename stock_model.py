@@ -0,0 +1,94 @@
+import numpy as np
+from toolpath import MOTION_FEED
+
+# Passo (mm) della griglia lungo l'asse del pezzo
+STOCK_RESOLUTION = 0.01
+
+# Numero massimo di celle della griglia, per pezzi molto lunghi
+MAX_STOCK_CELLS = 10000
+
+
+class StockModel:
+    """Pezzo al tornio come profilo raggio-posizione lungo l'asse (asse X del grafico).
+
+    radius[k] è il raggio del materiale rimasto in z[k]; ogni lavorazione lo riduce con un minimo
+    vettoriale, e outline restituisce il contorno del pezzo intero (simmetrico rispetto all'asse).
+    """
+
+    def __init__(self, z_min, z_max, radius, resolution=STOCK_RESOLUTION):
+        cells = int(min(np.ceil((z_max - z_min) / resolution), MAX_STOCK_CELLS)) + 1
+        self.z = np.linspace(z_min, z_max, cells)
+        self.step = (z_max - z_min) / (cells - 1) if cells > 1 else 1.0
+        self.initial_radius = radius
+        self.radius = np.full(cells, float(radius))
+
+    def reset(self):
+        self.radius[:] = self.initial_radius
+
+    def cut(self, xs, ys):
+        """Asporta il materiale lungo la spezzata percorsa dall'utensile (xs lungo l'asse, |ys| raggio)."""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        self.cut_segments(xs[:-1], ys[:-1], xs[1:], ys[1:])
+
+    def cut_segments(self, x0, y0, x1, y1):
+        """Asporta il materiale lungo segmenti indipendenti (x0, y0) -> (x1, y1)."""
+        r0 = np.abs(y0)
+        r1 = np.abs(y1)
+        last_cell = len(self.z) - 1
+        lo = (np.minimum(x0, x1) - self.z[0]) / self.step
+        hi = (np.maximum(x0, x1) - self.z[0]) / self.step
+        first = np.maximum(np.ceil(lo), 0).astype(np.int64)
+        last = np.minimum(np.floor(hi), last_cell).astype(np.int64)
+        # Segmenti più corti di una cella (per esempio le tuffate radiali) agiscono sulla cella più vicina
+        short = (last < first) & (hi >= -0.5) & (lo <= last_cell + 0.5)
+        nearest = np.clip(np.round((lo + hi) / 2), 0, last_cell).astype(np.int64)
+        first = np.where(short, nearest, first)
+        last = np.where(short, nearest, last)
+        count = np.maximum(last - first + 1, 0)
+
+        # Dentro l'intervallo di celle del segmento il raggio di taglio è lineare in z: r = a + b·z.
+        # I coefficienti si calcolano per segmento, così per ogni cella restano due operazioni
+        dx = x1 - x0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(dx != 0, (r1 - r0) / dx, 0.0)
+        intercept = np.where(dx != 0, r0 - slope * x0, np.minimum(r0, r1))
+        # I segmenti più corti di una cella usano il raggio nel punto del segmento più vicino alla cella
+        if short.any():
+            z = self.z[nearest[short]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.clip((z - x0[short]) / dx[short], 0.0, 1.0)
+            intercept[short] = np.where(dx[short] != 0, r0[short] + (r1 - r0)[short] * t, np.minimum(r0, r1)[short])
+            slope[short] = 0.0
+
+        total = int(count.sum())
+        if not total:
+            return
+        used = count > 0
+        # Celle consecutive di ogni segmento con una sola somma cumulativa
+        step = np.ones(total, dtype=np.int64)
+        starts = np.cumsum(count[used]) - count[used]
+        step[starts] = first[used] - np.concatenate(([0], last[used][:-1]))
+        cell = np.cumsum(step)
+        cut_radius = np.repeat(intercept[used], count[used]) + np.repeat(slope[used], count[used]) * self.z[cell]
+        np.minimum.at(self.radius, cell, cut_radius)
+
+    def outline(self):
+        """Vertici (N, 2) del contorno del pezzo: profilo superiore e poi quello inferiore a ritroso."""
+        top = np.column_stack((self.z, self.radius))
+        bottom = np.column_stack((self.z[::-1], -self.radius[::-1]))
+        return np.concatenate((top, bottom))
+
+
+def stock_for_toolpath(toolpath, resolution=STOCK_RESOLUTION):
+    """Grezzo che contiene tutte le lavorazioni del percorso (None se il programma non lavora)."""
+    feed_vertex = toolpath.motion[toolpath.path_block[1:]] == MOTION_FEED
+    if not feed_vertex.any():
+        return None
+    # Ogni segmento di lavoro comprende anche il vertice da cui parte
+    cutting = np.zeros(len(toolpath.path_x), dtype=bool)
+    cutting[1:] |= feed_vertex
+    cutting[:-1] |= feed_vertex
+    xs = toolpath.path_x[cutting]
+    radius = np.abs(toolpath.path_y[cutting])
+    return StockModel(float(xs.min()), float(xs.max()), float(radius.max()), resolution)
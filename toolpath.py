@@ -0,0 +1,180 @@
+import numpy as np
+from gcode_parser import FLAG_INCHES, FLAG_RELATIVE, KIND_G
+
+# Versione del calcolo del percorso utensile (da incrementare se cambiano i risultati)
+TOOLPATH_VERSION = 3
+
+# Posizione iniziale dell'utensile nel simulatore
+START_POSITION = (30.0, -10.0)
+
+# Velocità dei movimenti rapidi G0 (mm/min)
+RAPID_FEED_RATE = 1000.0
+
+# Massima distanza (mm) tra un arco G2/G3 e le corde che lo approssimano
+CHORD_TOLERANCE = 0.01
+
+# Tipo di movimento di ogni blocco
+MOTION_NONE = -1
+MOTION_RAPID = 0
+MOTION_FEED = 1
+
+_MM_PER_INCH = 25.4
+
+
+class Toolpath:
+    """Percorso utensile di un programma, un elemento per blocco.
+
+    x, y: posizione assoluta dopo il blocco (mm); length: lunghezza del percorso del blocco (mm);
+    feed: avanzamento modale in vigore (mm/min, NaN se mai impostato); motion: tipo di movimento;
+    duration: durata del blocco (min) all'avanzamento programmato, senza accelerazioni.
+    path_x, path_y, path_block: spezzata di tutto il programma (archi discretizzati) con il blocco
+    che ha generato ogni vertice; il primo vertice è la posizione iniziale (blocco -1).
+    """
+
+    def __init__(self, x, y, length, duration, feed, motion, path_x, path_y, path_block, start=START_POSITION):
+        self.x = x
+        self.y = y
+        self.length = length
+        self.duration = duration
+        self.feed = feed
+        self.motion = motion
+        self.path_x = path_x
+        self.path_y = path_y
+        self.path_block = path_block
+        self.start = tuple(start)
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def bounding_box(self):
+        """(x_min, y_min, x_max, y_max) del percorso, posizione iniziale compresa."""
+        xs = np.append(self.x, self.start[0])
+        ys = np.append(self.y, self.start[1])
+        return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
+
+    @property
+    def total_length(self):
+        return float(self.length.sum())
+
+
+def _last_valid_index(valid):
+    """Per ogni elemento, indice dell'ultimo elemento valido fino a lì compreso (-1 se nessuno)."""
+    index = np.where(valid, np.arange(len(valid)), -1)
+    np.maximum.accumulate(index, out=index)
+    return index
+
+
+def _axis_positions(words, moving, relative, start):
+    """Posizioni assolute di un asse, con riporto modale e supporto di G90/G91."""
+    given = moving & ~np.isnan(words)
+    increments = np.cumsum(np.where(given & relative, words, 0.0))
+    anchor = _last_valid_index(given & ~relative)
+    # Dopo un valore assoluto la posizione è quel valore più gli incrementi successivi
+    base = np.where(anchor >= 0, words[anchor] - increments[anchor], start)
+    return base + increments
+
+
+def _arc_centers(x0, y0, x1, y1, i, j, r, clockwise):
+    """Centri degli archi da parole I/J (incrementali) oppure R (formato raggio come in GRBL)."""
+    use_radius = np.isnan(i) & np.isnan(j)
+    dx = x1 - x0
+    dy = y1 - y0
+    chord = np.hypot(dx, dy)
+    # Se il raggio è troppo corto per la corda si degrada a una semicirconferenza
+    height = np.sqrt(np.maximum(4.0 * r * r - chord * chord, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h_x2_div_d = np.where(chord > 0, -height / chord, 0.0)
+    h_x2_div_d = np.where(clockwise, h_x2_div_d, -h_x2_div_d)
+    h_x2_div_d = np.where(r < 0, -h_x2_div_d, h_x2_div_d)
+    cx = np.where(use_radius, x0 + 0.5 * (dx - dy * h_x2_div_d), x0 + np.nan_to_num(i))
+    cy = np.where(use_radius, y0 + 0.5 * (dy + dx * h_x2_div_d), y0 + np.nan_to_num(j))
+    return cx, cy
+
+
+def _interpolate_arcs(x0, y0, x1, y1, cx, cy, clockwise, chord_tolerance):
+    """Discretizza gli archi in corde; restituisce lunghezze, numero di segmenti e vertici."""
+    radius = np.hypot(x0 - cx, y0 - cy)
+    start_angle = np.arctan2(y0 - cy, x0 - cx)
+    sweep = np.arctan2(y1 - cy, x1 - cx) - start_angle
+    # Verso di percorrenza: punti iniziale e finale coincidenti descrivono un cerchio completo
+    sweep = np.where(clockwise & (sweep >= -1e-9), sweep - 2 * np.pi, sweep)
+    sweep = np.where(~clockwise & (sweep <= 1e-9), sweep + 2 * np.pi, sweep)
+
+    # Angolo massimo per corda tale che la freccia non superi la tolleranza
+    with np.errstate(divide='ignore', invalid='ignore'):
+        max_step = 2.0 * np.arccos(np.clip(1.0 - chord_tolerance / radius, -1.0, 1.0))
+        segments = np.where(max_step > 0, np.ceil(np.abs(sweep) / max_step), 1)
+    segments = np.maximum(segments, 1).astype(np.int64)
+
+    # Indice k (1..n) di ogni vertice all'interno del proprio arco
+    arc_of_vertex = np.repeat(np.arange(len(segments)), segments)
+    k = np.arange(len(arc_of_vertex)) - np.repeat(np.cumsum(segments) - segments, segments) + 1
+    angle = start_angle[arc_of_vertex] + sweep[arc_of_vertex] * k / segments[arc_of_vertex]
+    vertex_x = cx[arc_of_vertex] + radius[arc_of_vertex] * np.cos(angle)
+    vertex_y = cy[arc_of_vertex] + radius[arc_of_vertex] * np.sin(angle)
+    # L'ultimo vertice coincide esattamente con il punto programmato
+    last = k == segments[arc_of_vertex]
+    vertex_x[last] = x1[arc_of_vertex[last]]
+    vertex_y[last] = y1[arc_of_vertex[last]]
+    return np.abs(sweep) * radius, segments, vertex_x, vertex_y
+
+
+def compute_toolpath(program, start=START_POSITION, chord_tolerance=CHORD_TOLERANCE):
+    """Calcola in un solo passaggio vettoriale il percorso utensile di un programma compilato."""
+    blocks = program.blocks
+    count = len(blocks)
+    is_g = blocks['kind'] == KIND_G
+    code = blocks['code']
+    rapid = is_g & (code == 0)
+    scale = np.where((blocks['flags'] & FLAG_INCHES) != 0, _MM_PER_INCH, 1.0)
+    arc_words = ~(np.isnan(blocks['i']) & np.isnan(blocks['j']) & np.isnan(blocks['r']))
+    arc = is_g & ((code == 2) | (code == 3)) & arc_words
+    moving = rapid | (is_g & (code == 1)) | arc
+    relative = (blocks['flags'] & FLAG_RELATIVE) != 0
+
+    x = _axis_positions(blocks['x'] * scale, moving, relative, start[0])
+    y = _axis_positions(blocks['y'] * scale, moving, relative, start[1])
+    x0 = np.concatenate(([start[0]], x[:-1]))
+    y0 = np.concatenate(([start[1]], y[:-1]))
+    length = np.hypot(x - x0, y - y0)
+
+    # Archi G2/G3: lunghezza reale e vertici della spezzata entro la tolleranza di corda
+    arc_blocks = blocks[arc]
+    clockwise = arc_blocks['code'] == 2
+    cx, cy = _arc_centers(x0[arc], y0[arc], x[arc], y[arc], arc_blocks['i'] * scale[arc],
+                          arc_blocks['j'] * scale[arc], arc_blocks['r'] * scale[arc], clockwise)
+    arc_length, arc_segments, arc_x, arc_y = _interpolate_arcs(
+        x0[arc], y0[arc], x[arc], y[arc], cx, cy, clockwise, chord_tolerance)
+    length[arc] = arc_length
+
+    vertices = np.zeros(count, dtype=np.int64)
+    vertices[moving] = 1
+    vertices[arc] = arc_segments
+    first_vertex = np.cumsum(vertices) - vertices + 1  # +1 per la posizione iniziale
+    total = int(vertices.sum()) + 1
+    path_x = np.empty(total)
+    path_y = np.empty(total)
+    path_x[0], path_y[0] = start
+    lines = moving & ~arc
+    path_x[first_vertex[lines]] = x[lines]
+    path_y[first_vertex[lines]] = y[lines]
+    arc_vertex_index = np.repeat(first_vertex[arc], arc_segments)
+    arc_vertex_index += np.arange(len(arc_vertex_index)) - np.repeat(np.cumsum(arc_segments) - arc_segments, arc_segments)
+    path_x[arc_vertex_index] = arc_x
+    path_y[arc_vertex_index] = arc_y
+    path_block = np.concatenate(([-1], np.repeat(np.arange(count), vertices)))
+
+    feed_words = blocks['f'] * scale
+    last_feed = _last_valid_index(~np.isnan(feed_words))
+    feed = np.where(last_feed >= 0, feed_words[last_feed], np.nan)
+
+    rate = np.where(rapid, RAPID_FEED_RATE, feed)
+    duration = np.zeros(count)
+    timed = moving & (rate > 0)
+    duration[timed] = length[timed] / rate[timed]
+
+    motion = np.full(count, MOTION_NONE, dtype=np.int8)
+    motion[moving] = MOTION_FEED
+    motion[rapid] = MOTION_RAPID
+    return Toolpath(x, y, length, duration, feed, motion, path_x, path_y, path_block, start)
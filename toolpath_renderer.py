@@ -0,0 +1,196 @@
+import numpy as np
+from matplotlib.lines import Line2D
+from matplotlib.patches import Polygon
+from level_of_detail import LOD_MIN_POINTS, LevelOfDetail, pixel_size
+from toolpath import MOTION_FEED, MOTION_RAPID
+
+# Stile delle linee per tipo di movimento
+MOTION_STYLES = {MOTION_RAPID: 'red', MOTION_FEED: 'blue'}
+
+
+def tool_triangle(x, y):
+    """Vertici del triangolino che rappresenta l'utensile."""
+    return [[x, y], [x - 1, y - 1], [x + 1, y - 1]]
+
+
+class _GrowingLine:
+    """Coordinate di una spezzata in array preallocati che crescono per raddoppio; NaN separa i tratti."""
+
+    def __init__(self, capacity):
+        self.xs = np.empty(capacity)
+        self.ys = np.empty(capacity)
+        self.count = 0
+        self._detail = None
+
+    def _reserve(self, extra):
+        if self.count + extra <= len(self.xs):
+            return
+        capacity = max(2 * len(self.xs), self.count + extra)
+        self.xs = np.resize(self.xs, capacity)
+        self.ys = np.resize(self.ys, capacity)
+
+    def append(self, xs, ys):
+        """Aggiunge una spezzata; se non prosegue l'ultimo punto inserisce un'interruzione."""
+        joined = self.count and self.xs[self.count - 1] == xs[0] and self.ys[self.count - 1] == ys[0]
+        if joined:
+            xs, ys = xs[1:], ys[1:]
+        elif self.count:
+            xs = np.concatenate(([np.nan], xs))
+            ys = np.concatenate(([np.nan], ys))
+        self._reserve(len(xs))
+        self.xs[self.count:self.count + len(xs)] = xs
+        self.ys[self.count:self.count + len(ys)] = ys
+        self.count += len(xs)
+
+    def clear(self):
+        self.count = 0
+        self._detail = None
+
+    def visible_data(self, ax):
+        """Vertici da disegnare nella vista attuale dell'asse, decimati se la spezzata è molto lunga."""
+        xs, ys = self.xs[:self.count], self.ys[:self.count]
+        if self.count < LOD_MIN_POINTS:
+            return xs, ys
+        # La piramide si ricostruisce solo quando la parte aggiunta dopo l'ultima costruzione è grande
+        if self._detail is None or self.count - self._detail.count > self._detail.count // 4:
+            self._detail = LevelOfDetail(xs, ys)
+        x_min, x_max = sorted(ax.get_xlim())
+        y_min, y_max = sorted(ax.get_ylim())
+        view_x, view_y = self._detail.view(x_min, x_max, y_min, y_max, pixel_size(ax))
+        tail = self._detail.count - 1
+        return np.concatenate((view_x, [np.nan], xs[tail:])), np.concatenate((view_y, [np.nan], ys[tail:]))
+
+
+class _DetailLine(Line2D):
+    """Line2D persistente che a ogni ridisegno completo prende i dati dal livello di dettaglio adatto alla vista."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__([], [], **kwargs)
+        self.path = path
+
+    def draw(self, renderer):
+        self.set_data(*self.path.visible_data(self.axes))
+        super().draw(renderer)
+
+
+class ToolpathRenderer:
+    """Disegna il percorso utensile con un solo Line2D per tipo di movimento più il marcatore utensile.
+
+    I nuovi tratti vengono disegnati sopra lo sfondo salvato con copy_from_bbox e mostrati con blit,
+    quindi il costo di ogni fotogramma dipende solo da quanto è cambiato, non dalla lunghezza del percorso.
+    Un ridisegno completo (ridimensionamento, zoom) usa i Line2D persistenti, decimati secondo la vista
+    con LevelOfDetail, e risalva lo sfondo.
+    """
+
+    def __init__(self, ax, canvas, start, capacity=4096):
+        self.ax = ax
+        self.canvas = canvas
+        self._paths = {}
+        self._pending = {}
+        self._overlays = {}
+        for motion, color in MOTION_STYLES.items():
+            self._paths[motion] = _GrowingLine(capacity)
+            ax.add_line(_DetailLine(self._paths[motion], color=color, linewidth=1))
+            self._pending[motion] = ([], [])
+            overlay = Line2D([], [], color=color, linewidth=1, animated=True)
+            ax.add_line(overlay)
+            self._overlays[motion] = overlay
+
+        self.piece = Polygon(np.zeros((1, 2)), closed=True, facecolor='0.6', edgecolor='black', alpha=0.5,
+                             animated=True, visible=False)
+        ax.add_patch(self.piece)
+        self.tool = Polygon(tool_triangle(*start), closed=True, color='green', animated=True)
+        ax.add_patch(self.tool)
+        self._background = None
+        self._draw_connection = canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_path(self, xs, ys, motion):
+        """Aggiunge al percorso una spezzata del tipo di movimento indicato."""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        self._paths[motion].append(xs, ys)
+        pending_x, pending_y = self._pending[motion]
+        pending_x.append(xs)
+        pending_y.append(ys)
+
+    def set_path(self, xs, ys, segment_motion):
+        """Sostituisce tutto il percorso disegnato; segment_motion ha un elemento per segmento.
+
+        Serve dopo un salto a un'altra istruzione: le spezzate di ogni tipo di movimento si
+        ricostruiscono in modo vettoriale e il ridisegno completo avviene al prossimo update.
+        """
+        for motion, path in self._paths.items():
+            path.clear()
+            pending_x, pending_y = self._pending[motion]
+            pending_x.clear()
+            pending_y.clear()
+            selected = np.flatnonzero(segment_motion == motion)
+            if not len(selected):
+                continue
+            # Vertici dei tratti consecutivi dello stesso tipo, separati da NaN
+            run_start = np.ones(len(selected), dtype=bool)
+            run_start[1:] = selected[1:] != selected[:-1] + 1
+            vertices = np.sort(np.concatenate((selected[run_start], selected + 1)))
+            breaks = np.searchsorted(vertices, selected[run_start][1:])
+            path.append(np.insert(xs[vertices], breaks, np.nan), np.insert(ys[vertices], breaks, np.nan))
+        self._background = None
+
+    def move_tool(self, x, y):
+        """Sposta il marcatore dell'utensile."""
+        self.tool.set_xy(tool_triangle(x, y))
+
+    def show_piece(self, outline):
+        """Mostra (o aggiorna) il contorno del pezzo lavorato come unico poligono pieno."""
+        self.piece.set_xy(outline)
+        self.piece.set_visible(True)
+
+    def hide_piece(self):
+        self.piece.set_visible(False)
+
+    def update(self):
+        """Mostra i tratti aggiunti e la posizione dell'utensile ridisegnando solo le aree animate."""
+        if self._background is None:
+            self.canvas.draw()  # Il primo ridisegno completo salva lo sfondo in _on_draw
+            return
+
+        self.canvas.restore_region(self._background)
+        for motion, (pending_x, pending_y) in self._pending.items():
+            if not pending_x:
+                continue
+            overlay = self._overlays[motion]
+            overlay.set_data(_join(pending_x), _join(pending_y))
+            self.ax.draw_artist(overlay)
+            pending_x.clear()
+            pending_y.clear()
+        # Lo sfondo ora comprende anche i nuovi tratti
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def remove(self):
+        """Scollega il renderer dalla figura."""
+        self.canvas.mpl_disconnect(self._draw_connection)
+
+    def _on_draw(self, event):
+        # Ridisegno completo: i Line2D persistenti contengono già tutto il percorso
+        for pending_x, pending_y in self._pending.values():
+            pending_x.clear()
+            pending_y.clear()
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        # Pezzo e utensile cambiano a ogni fotogramma e non fanno parte dello sfondo salvato
+        if self.piece.get_visible():
+            self.ax.draw_artist(self.piece)
+        self.ax.draw_artist(self.tool)
+
+
+def _join(parts):
+    """Concatena i tratti in sospeso separandoli con NaN."""
+    joined = []
+    for part in parts:
+        if joined:
+            joined.append([np.nan])
+        joined.append(part)
+    return np.concatenate(joined)